@@ -1,17 +1,21 @@
 import os
 import sys
-import subprocess
-import configparser
 import time
-import msvcrt
-import shutil
+import argparse
 import datetime
+import collections
+import itertools
+import fnmatch
+import re
+import json
+import hashlib
+import threading
+import glob
+import struct
+import mmap
+import importlib
 import ctypes
 from ctypes import wintypes
-import win32api
-import win32con
-from win32com.shell.shell import SHChangeNotify
-from win32com.shell import shellcon
 
 # 版本信息
 VERSION = "IconFolio v25.9.6 by DouBaoAi"  # 版本号更新
@@ -20,39 +24,114 @@ VERSION = "IconFolio v25.9.6 by DouBaoAi"  # 版本号更新
 OPERATE_DIR = ""
 FOLDERS_TXT_NAME = "folders.txt"
 EXCLUDE_KEYWORDS = ["uninstall", "step"]
+SCAN_INDEX_NAME = ".iconfolio_scan_index.json"  # EXE扫描索引（按目录mtime复用）
+MANIFEST_NAME = ".iconfolio_manifest.json"  # 本工具写入的desktop.ini清单（含内容哈希）
+USE_CONFIG_DB = False  # True=用SQLite配置库代替folders.txt（菜单D可与folders.txt互相导入导出）
+CONFIG_DB_NAME = ".iconfolio.db"  # SQLite配置库文件名
+JOURNAL_NAME = ".iconfolio_journal.log"  # 批量操作断点续跑日志（追加写入）
+REFRESH_CHUNK = 200  # 刷新时每批文件夹数，每批完成后记入日志（中断后从下一批继续）
+BACKUP_DIR_NAME = ".iconfolio_backups"  # 配置备份库目录（压缩、按内容去重）
+BACKUP_KEEP = 30  # 最多保留的备份份数（超出时删除最旧的）
+REFRESH_TIME_BUDGET = 10.0  # 批量刷新时重试缓存生成的总时间预算（秒）
+EXPLORER_RESTART_BUDGET = 30.0  # 重启资源管理器全过程的时间预算（秒）
+VERIFY_ICON_CACHE = True  # 刷新前读取图标缓存，跳过已缓存的文件夹
+CLEAN_ORPHAN_DEPTH = 1  # 清理时扫描未登记desktop.ini的最大深度（0=仅操作目录本身）
+IGNORE_FILE_NAME = "folders.ignore"  # 与folders.txt同目录的扫描规则文件
+# 默认剪枝的目录（整棵子树都不进入）
+PRUNE_DIRS = ["_CommonRedist", "CommonRedist", "redist", "__Installer", "locale", "locales"]
+EXE_SCAN_MAX_DEPTH = None  # EXE扫描最大深度（None=不限）
+SCAN_WORKERS = 8  # 并行扫描线程数（1=串行）
+MIN_TIMING_SECONDS = 0.05  # 耗时低于此值时不显示加速估计（计时误差占比太大）
+PREFETCH_AHEAD = 3  # 交互模式后台预扫描的文件夹数
+RANK_EXES = True  # 按内嵌图标质量对候选EXE排序
+RANK_MAX_CANDIDATES = 32  # 排序时最多读取PE信息的候选EXE数（其余按广度优先顺序排在后面）
+DESKTOP_INI_WORKERS = 8  # 并行写入desktop.ini的线程数（1=串行）
 FOLDERS_ENCODING = "gbk"  # Windows中文系统ANSI编码对应gbk
-# 确定系统编码（扩展常见映射版）
-try:
-    # 调用Windows API获取ANSI代码页
-    cp = ctypes.windll.kernel32.GetACP()
-    
-    # 常见代码页与编码的映射关系（扩展至10个主要语言区域）
-    code_page_map = {
-        936: "gbk",        # 简体中文
-        65001: "utf-8",    # Unicode (UTF-8)
-        1252: "cp1252",    # 西欧语言（英语、法语、德语等）
-        950: "big5",       # 繁体中文
-        932: "shift_jis",  # 日语
-        949: "cp949",      # 韩语
-        1251: "cp1251",    # 俄语
-        1250: "cp1250",    # 中欧语言（波兰语、捷克语等）
-        1254: "cp1254",    # 土耳其语
-        874: "cp874"       # 泰语
-    }
-    
-    # 查找对应的编码，如果没有则使用默认
-    FOLDERS_ENCODING = code_page_map.get(cp, "gbk")
-    print(f"✅ 自动检测到系统编码: {FOLDERS_ENCODING} (代码页: {cp})")
-except Exception as e:
-    # 其他异常情况使用默认编码
-    FOLDERS_ENCODING = "gbk"
-    print(f"❌ 获取系统编码时发生错误: {e}，使用默认编码: {FOLDERS_ENCODING}")
+DESKTOP_INI_ENCODING = "ansi"  # desktop.ini 使用系统ANSI代码页
+DESKTOP_INI_TEMP_SUFFIX = ".iconfolio.tmp"  # 原子替换时同目录临时文件后缀
+SKIP_PLACEHOLDER_EXES = False  # True=候选中不列出云同步占位EXE；默认只排在本地EXE之后
+EXTRACT_ICONS = True  # 把EXE的图标提取为.ico，desktop.ini 引用小文件而不是EXE
+ICON_STORE_NAME = ".iconfolio_icons"  # 共享图标库目录（按图标内容哈希命名，相同图标只存一份）
+ICON_FILE_NAME = "IconFolio.ico"  # 旧版提取到各文件夹内的图标文件名（写入时自动清除）
+STARTUP_BUDGET_MS = 60  # 启动耗时预算：运行 --version 比空解释器多出的毫秒数（tests/test_startup.py 核对）
+# 常见代码页与编码的映射关系（扩展至10个主要语言区域）
+CODE_PAGE_ENCODINGS = {
+    936: "gbk",        # 简体中文
+    65001: "utf-8",    # Unicode (UTF-8)
+    1252: "cp1252",    # 西欧语言（英语、法语、德语等）
+    950: "big5",       # 繁体中文
+    932: "shift_jis",  # 日语
+    949: "cp949",      # 韩语
+    1251: "cp1251",    # 俄语
+    1250: "cp1250",    # 中欧语言（波兰语、捷克语等）
+    1254: "cp1254",    # 土耳其语
+    874: "cp874"       # 泰语
+}
+
+
+def detect_folders_encoding(verbose=True):
+    """按系统ANSI代码页确定folders.txt编码（检测失败时使用gbk）"""
+    try:
+        # 调用Windows API获取ANSI代码页
+        cp = ctypes.windll.kernel32.GetACP()
+        encoding = CODE_PAGE_ENCODINGS.get(cp, "gbk")
+        if verbose:
+            print(f"✅ 自动检测到系统编码: {encoding} (代码页: {cp})")
+        return encoding
+    except Exception as e:
+        # 其他异常情况使用默认编码
+        if verbose:
+            print(f"❌ 获取系统编码时发生错误: {e}，使用默认编码: gbk")
+        return "gbk"
+
+
+# ------------------------------
+# 延迟导入（启动时不加载 pywin32 和系统 DLL，首次用到时才加载）
+# ------------------------------
+class LazyImport:
+    """代理对象：首次访问属性时才调用 loader 加载模块或 DLL，之后直接转发"""
+
+    def __init__(self, loader, hint=None):
+        self._loader = loader
+        self._hint = hint
+        self._target = None
+
+    def __getattr__(self, name):
+        target = self._target
+        if target is None:
+            try:
+                target = self._target = self._loader()
+            except ImportError as e:
+                raise ImportError(f"{e}（{self._hint}）" if self._hint else str(e)) from e
+        return getattr(target, name)
+
+
+def lazy_module(name, hint=None):
+    return LazyImport(lambda: importlib.import_module(name), hint)
+
+
+# 启动时不应加载的模块（tests/test_startup.py 核对）
+LAZY_MODULES = ("win32api", "win32con", "win32com.shell.shell", "win32com.shell.shellcon",
+                "concurrent.futures", "subprocess", "shutil", "sqlite3", "gzip", "tempfile")
+PYWIN32_HINT = "缺少 pywin32，请执行：pip install pywin32"
+win32api = lazy_module("win32api", PYWIN32_HINT)
+win32con = lazy_module("win32con", PYWIN32_HINT)
+shell = lazy_module("win32com.shell.shell", PYWIN32_HINT)
+shellcon = lazy_module("win32com.shell.shellcon", PYWIN32_HINT)
+# 只有个别功能用到的标准库模块（线程池、重启资源管理器、配置库、备份、读取图标缓存）
+concurrent_futures = lazy_module("concurrent.futures")
+subprocess = lazy_module("subprocess")
+shutil = lazy_module("shutil")
+sqlite3 = lazy_module("sqlite3")
+gzip = lazy_module("gzip")
+tempfile = lazy_module("tempfile")
+
 
 # ------------------------------
 # Windows API 基础定义
 # ------------------------------
-user32 = ctypes.WinDLL('user32', use_last_error=True)
-shell32 = ctypes.WinDLL('shell32', use_last_error=True)
+user32 = LazyImport(lambda: ctypes.WinDLL('user32', use_last_error=True))
+shell32 = LazyImport(lambda: ctypes.WinDLL('shell32', use_last_error=True))
 
 # 用于图标缓存的结构体和常量
 class SHFILEINFO(ctypes.Structure):
@@ -76,6 +155,7 @@ FILE_ATTRIBUTE_DIRECTORY = 0x00000010
 # ------------------------------
 def wait_for_space():
     """等待空格键确认，统一交互体验"""
+    import msvcrt
     print("按空格键继续...", end='', flush=True)
     while True:
         if msvcrt.getch() == b' ':
@@ -83,8 +163,37 @@ def wait_for_space():
             break
 
 
+def load_json(path, default):
+    """读取JSON文件，不存在或损坏时返回默认值"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def decide(option, *args):
+    """无交互选项：True/False 直接使用；可调用对象（如菜单中的询问）以 args 调用后取其结果"""
+    return bool(option(*args) if callable(option) else option)
+
+
+def save_json_atomic(path, data):
+    """先写同目录临时文件再替换，避免中途中断留下半个文件"""
+    temp_path = f"{path}.tmp"
+    with OwnRootWrite(path):
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_path, path)
+
+
+_DEPENDENCY_OK = None  # check_dependency 的结果（每个进程只检查一次）
+
+
 def check_dependency():
-    """检查并自动安装pywin32依赖"""
+    """检查并自动安装pywin32依赖（结果缓存，重复调用不再导入或启动pip）"""
+    global _DEPENDENCY_OK
+    if _DEPENDENCY_OK is not None:
+        return _DEPENDENCY_OK
     required = [
         ("win32api", "pywin32"),
         ("win32com.shell", "pywin32")
@@ -107,7 +216,9 @@ def check_dependency():
                 print(f"✅ {install_name} 安装成功")
             except Exception as e:
                 print(f"❌ 安装失败，请手动执行：pip install {install_name}")
+                _DEPENDENCY_OK = False
                 return False
+    _DEPENDENCY_OK = True
     return True
 
 
@@ -183,12 +294,15 @@ def trigger_icon_cache(folder_path):
             
         success = result_small != 0 or result_large != 0
         
+        # 云同步占位文件夹上改属性/写临时文件会触发同步或下载，不走后备方法
+        if not success and PLACEHOLDERS.is_placeholder(folder_path):
+            return False
+        
         # 方法2：修改文件夹属性触发缓存（如果方法1失败）
         if not success:
             attr = win32api.GetFileAttributes(folder_path)
-            # 先设置为只读
+            # 先设置为只读（属性变化本身会产生系统变更通知）
             win32api.SetFileAttributes(folder_path, win32con.FILE_ATTRIBUTE_READONLY)
-            time.sleep(0.1)  # 短暂延迟确保系统捕获变化
             # 恢复原属性
             win32api.SetFileAttributes(folder_path, attr)
             success = True
@@ -211,32 +325,37 @@ def trigger_icon_cache(folder_path):
         return False
 
 
-def refresh_folder(folder_path):
-    """刷新单个文件夹并触发缓存生成"""
-    try:
-        # 确保路径规范化
-        folder_path = os.path.abspath(folder_path)
-        folder_path = os.path.normpath(folder_path)
-        folder_name = os.path.basename(folder_path)
-        
-        # 初始化缓存成功标志（默认设为False）
-        cache_success = False  # 关键修复：在函数开始处定义变量
-        
-        # 步骤1：通知系统文件夹属性已更新
-        SHChangeNotify(
-            shellcon.SHCNE_UPDATEDIR,
-            shellcon.SHCNF_PATH | shellcon.SHCNF_FLUSH,
-            os.fsencode(folder_path),
-            None
-        )
-        
-        # 步骤2：设置为系统文件夹属性
+def notify_folder_updated(folder_path, flush=False):
+    """通知系统该文件夹项（图标/别名）及其内容已更新（默认不等待资源管理器处理完）"""
+    flags = shellcon.SHCNF_PATH | (shellcon.SHCNF_FLUSH if flush else shellcon.SHCNF_FLUSHNOWAIT)
+    # UPDATEITEM 让父目录视图重绘该文件夹的图标，UPDATEDIR 刷新文件夹本身
+    shell.SHChangeNotify(shellcon.SHCNE_UPDATEITEM, flags, os.fsencode(folder_path), None)
+    shell.SHChangeNotify(shellcon.SHCNE_UPDATEDIR, flags, os.fsencode(folder_path), None)
+
+
+class RefreshScheduler:
+    """批量刷新文件夹并触发图标缓存生成
+
+    不再逐个文件夹固定等待：先统一加系统属性，再逐个触发缓存，
+    失败的文件夹按指数退避整批重试（受总时间预算限制），最后统一恢复属性并发通知。
+    分批调用 run 时各批共用同一个时间预算（从第一批开始计时）。
+    """
+
+    def __init__(self, time_budget=REFRESH_TIME_BUDGET):
+        self.time_budget = time_budget
+        self.deadline = None
+        self.elapsed = 0.0
+        self.retries = 0
+
+    @staticmethod
+    def _set_system_attribute(folder_path, cached=None):
+        """加系统属性，返回原属性；失败时返回None（cached 为快照中的属性，有则不再读取）"""
         try:
-            original_attr = win32api.GetFileAttributes(folder_path)
+            original_attr = cached or win32api.GetFileAttributes(folder_path)
             win32api.SetFileAttributes(folder_path, original_attr | win32con.FILE_ATTRIBUTE_SYSTEM)
-            time.sleep(0.2)
+            return original_attr
         except Exception as e:
-            print(f"   ⚠️ 属性设置警告：{str(e)}")
+            print(f"   ⚠️ 属性设置警告：{os.path.basename(folder_path)} {str(e)}")
             try:
                 subprocess.run(
                     f'attrib +s "{folder_path}"',
@@ -245,95 +364,347 @@ def refresh_folder(folder_path):
                     stdout=subprocess.DEVNULL,
                     stderr=subprocess.DEVNULL
                 )
-                time.sleep(0.2)
+                return win32api.GetFileAttributes(folder_path) & ~win32con.FILE_ATTRIBUTE_SYSTEM
             except Exception as e2:
-                print(f"   ❌ 属性设置失败：{str(e2)}")
-                return False, cache_success  # 现在可以安全返回了
-        
-        # 步骤3：多次尝试触发图标缓存生成
-        for attempt in range(3):
-            cache_success = trigger_icon_cache(folder_path)
-            if cache_success:
-                break
-            time.sleep(0.2)
-            
-        # 步骤4：恢复原始属性
-        time.sleep(0.2)
-        win32api.SetFileAttributes(folder_path, original_attr)
-        
-        # 步骤5：再次通知系统更新
-        SHChangeNotify(
-            shellcon.SHCNE_UPDATEDIR,
-            shellcon.SHCNF_PATH | shellcon.SHCNF_FLUSH,
-            os.fsencode(folder_path),
-            None
+                print(f"   ❌ 属性设置失败：{os.path.basename(folder_path)} {str(e2)}")
+                return None
+
+    def run(self, folder_paths, attributes=None):
+        """刷新一批文件夹，返回 {规范化路径: (刷新成功, 缓存生成成功)}
+
+        attributes 为 {文件夹路径: 快照中的属性}，有记录的文件夹不再逐个读取属性。
+        """
+        start = time.perf_counter()
+        if self.deadline is None:
+            self.deadline = start + self.time_budget
+        paths = [os.path.normpath(os.path.abspath(p)) for p in folder_paths]
+        results = {path: (False, False) for path in paths}
+        cached = {os.path.normpath(os.path.abspath(p)): attr for p, attr in (attributes or {}).items()}
+
+        # 步骤1：统一设置系统文件夹属性
+        original_attrs = {}
+        for path in paths:
+            attr = self._set_system_attribute(path, cached.get(path))
+            if attr is not None:
+                original_attrs[path] = attr
+
+        try:
+            # 步骤2：逐个触发图标缓存生成
+            pending = [path for path in original_attrs if not trigger_icon_cache(path)]
+
+            # 步骤3：失败的整批重试，等待时间逐轮加倍，不超过总时间预算
+            delay = 0.05
+            while pending and time.perf_counter() + delay < self.deadline:
+                time.sleep(delay)
+                self.retries += 1
+                pending = [path for path in pending if not trigger_icon_cache(path)]
+                delay *= 2
+            failed = set(pending)
+        finally:
+            # 步骤4：统一恢复原始属性
+            for path, attr in original_attrs.items():
+                try:
+                    win32api.SetFileAttributes(path, attr)
+                except Exception as e:
+                    print(f"   ⚠️  恢复属性失败：{os.path.basename(path)} {str(e)}")
+
+        # 步骤5：逐个通知系统更新，最后一个等待资源管理器处理完
+        notified = list(original_attrs)
+        for i, path in enumerate(notified):
+            try:
+                notify_folder_updated(path, flush=(i == len(notified) - 1))
+                results[path] = (True, path not in failed)
+            except Exception as e:
+                print(f"   ❌ 刷新失败: {os.path.basename(path)} {str(e)}")
+
+        self.elapsed += time.perf_counter() - start
+        return results
+
+    def summary(self, count):
+        rate = count / self.elapsed if self.elapsed > 0 else float(count)
+        return f"刷新 {count} 个文件夹耗时 {self.elapsed:.2f} 秒（{rate:.1f} 个/秒，重试 {self.retries} 轮）"
+
+
+def wait_until(condition, timeout, interval=0.05, max_interval=0.5):
+    """轮询直到条件成立或超时，返回条件是否成立（轮询间隔逐步加大）"""
+    deadline = time.monotonic() + timeout
+    while True:
+        if condition():
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, max_interval)
+
+
+def icon_cache_files():
+    """列出现有的系统图标缓存文件"""
+    local_appdata = os.environ.get("LOCALAPPDATA", "")
+    files = [os.path.join(local_appdata, "IconCache.db")]
+    files += glob.glob(os.path.join(local_appdata, "Microsoft", "Windows", "Explorer", "iconcache*"))
+    return [f for f in files if os.path.isfile(f)]
+
+
+class WindowsProcessBackend:
+    """实际的进程/文件操作，ExplorerController 通过它访问系统（可替换为假实现做测试）"""
+
+    def is_running(self, image_name):
+        result = subprocess.run(
+            ["tasklist", "/FI", f"IMAGENAME eq {image_name}", "/NH"],
+            capture_output=True, text=True
         )
-        
-        return True, cache_success
-    except Exception as e:
-        print(f"   ❌ 刷新失败: {str(e)}")
-        return False, False  # 这里也能安全返回
+        return image_name.lower() in result.stdout.lower()
+
+    def kill(self, image_name):
+        subprocess.run(["taskkill", "/f", "/im", image_name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def start(self, args):
+        subprocess.Popen(args)
+
+    def run(self, args):
+        subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def shell_ready(self):
+        """任务栏窗口出现即认为系统外壳已就绪"""
+        return bool(user32.FindWindowW("Shell_TrayWnd", None))
+
+    def remove_file(self, path):
+        os.remove(path)
+
+
+class ExplorerController:
+    """按真实状态轮询而非固定等待地重启资源管理器，所有步骤共用一个时间预算"""
+
+    def __init__(self, backend=None, budget=EXPLORER_RESTART_BUDGET):
+        self.backend = backend or WindowsProcessBackend()
+        self.deadline = time.monotonic() + budget
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+    def stop(self):
+        """结束资源管理器并等待进程真正退出"""
+        self.backend.kill("explorer.exe")
+        return wait_until(lambda: not self.backend.is_running("explorer.exe"), self.remaining())
+
+    def delete_files(self, paths):
+        """删除文件，被占用时轮询重试直到解锁或预算用完，返回（已删除, 失败）列表"""
+        deleted, failed = [], []
+        for path in paths:
+            def try_remove():
+                try:
+                    self.backend.remove_file(path)
+                    return True
+                except FileNotFoundError:
+                    return True
+                except OSError:
+                    return False
+            (deleted if wait_until(try_remove, self.remaining()) else failed).append(path)
+        return deleted, failed
+
+    def start(self):
+        """启动资源管理器并等待系统外壳就绪"""
+        self.backend.start(["explorer.exe"])
+        return wait_until(self.backend.shell_ready, self.remaining())
+
+    def ensure_running(self):
+        """资源管理器未运行时启动它"""
+        if self.backend.is_running("explorer.exe"):
+            return True
+        return self.start()
+
+    def clear_icon_cache(self):
+        self.backend.run(["ie4uinit.exe", "-ClearIconCache"])
 
+    def open_folder(self, path):
+        self.backend.start(["explorer.exe", path])
 
-def refresh_system_icon_cache():
-    """刷新系统图标缓存"""
+
+def refresh_system_icon_cache(controller=None, open_dir=None):
+    """刷新系统图标缓存（完成后打开 open_dir，默认为菜单中选择的操作目录）"""
+    open_dir = open_dir or OPERATE_DIR
+    controller = controller or ExplorerController()
     try:
         print("\n" + "-" * 40)
         print("          刷新系统图标缓存          ")
         print("-" * 40)
-        
-        # 缓存文件路径
-        cache_paths = [
-            os.path.join(os.environ.get("LOCALAPPDATA", ""), "IconCache.db"),
-            os.path.join(os.environ.get("USERPROFILE", ""), "AppData\\Local\\Microsoft\\Windows\\Explorer\\iconcache*")
-        ]
+        start = time.monotonic()
         
         # 终止资源管理器进程
         print("   终止资源管理器进程...")
-        subprocess.run(["taskkill", "/f", "/im", "explorer.exe"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        time.sleep(1)
+        if not controller.stop():
+            print("   ⚠️  等待资源管理器退出超时，继续尝试")
+        
+        # 删除缓存文件（被占用时等待解锁）
+        deleted, failed = controller.delete_files(icon_cache_files())
+        for path in deleted:
+            print(f"   删除缓存：{path}")
+        for path in failed:
+            print(f"   缓存删除失败 {path}：文件仍被占用")
         
-        # 删除缓存文件
-        for path in cache_paths:
-            try:
-                if "*" in path:
-                    import glob
-                    for f in glob.glob(path):
-                        if os.path.exists(f):
-                            os.remove(f)
-                            print(f"   删除缓存：{f}")
-                elif os.path.exists(path):
-                    os.remove(path)
-                    print(f"   删除缓存：{path}")
-            except Exception as e:
-                print(f"   缓存删除失败 {path}：{str(e)}")
-        time.sleep(2)
         print("   重启资源管理器（系统外壳）...")
-        subprocess.Popen(["explorer.exe"])  
+        if not controller.start():
+            print("   ⚠️  等待系统外壳就绪超时")
         # 额外清理：重建图标缓存数据库
         print("   重建系统图标缓存...")
-        subprocess.run(
-            ["ie4uinit.exe", "-ClearIconCache"],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
-        )
-        time.sleep(2)
+        controller.clear_icon_cache()
         # 单独打开工作目录
-        if OPERATE_DIR and os.path.isdir(OPERATE_DIR):
-            print(f"   打开工作目录：{OPERATE_DIR}")
-            subprocess.Popen(["explorer.exe", OPERATE_DIR])
-            time.sleep(2)
-        print("✅ 系统图标缓存已重建，任务栏已恢复")
+        if open_dir and os.path.isdir(open_dir):
+            print(f"   打开工作目录：{open_dir}")
+            controller.open_folder(open_dir)
+        print(f"✅ 系统图标缓存已重建，任务栏已恢复（耗时 {time.monotonic() - start:.1f} 秒）")
         return True
     except Exception as e:
         print(f"⚠️  系统缓存刷新失败：{str(e)}")
         # 确保资源管理器重启
-        subprocess.Popen(["explorer.exe"])
-        time.sleep(2)
-        subprocess.Popen(["explorer.exe", OPERATE_DIR])
+        try:
+            controller.ensure_running()
+            if open_dir:
+                controller.open_folder(open_dir)
+        except Exception:
+            pass
         return False
 
 
+# ------------------------------
+# 图标缓存数据库读取（纯Python，只读文件副本）
+# ------------------------------
+class IconCacheEntry:
+    """iconcache_*.db 中的一条缓存记录"""
+    __slots__ = ("hash", "identifier", "width", "height", "data_size", "offset")
+
+    def __init__(self, hash, identifier, width, height, data_size, offset):
+        self.hash = hash
+        self.identifier = identifier
+        self.width = width
+        self.height = height
+        self.data_size = data_size
+        self.offset = offset
+
+
+# 各格式版本的记录头长度：Vista=20, Win7=21, Win8及以后>=30
+_CMMM_ENTRY_HEADER = {20: 56, 21: 48}
+_CMMM_ENTRY_HEADER_WIN8 = 56
+
+
+def parse_icon_cache_db(data):
+    """解析 CMMM 格式的 iconcache_*.db，返回（格式版本, 记录列表）
+
+    文件头：签名 CMMM、版本、缓存类型，Win8 起多一个保留字段，随后是首条记录偏移；
+    记录头：签名 CMMM、记录长度、8字节哈希、标识串/填充/数据长度……
+    数据损坏时在出错位置停止，返回已解析的部分。
+    """
+    if len(data) < 24 or data[:4] != b"CMMM":
+        raise ValueError("不是有效的图标缓存文件")
+    version, = struct.unpack_from("<I", data, 4)
+    first_offset, = struct.unpack_from("<I", data, 16 if version >= 30 else 12)
+    header_size = _CMMM_ENTRY_HEADER.get(version, _CMMM_ENTRY_HEADER_WIN8)
+
+    entries = []
+    offset = first_offset
+    while offset + header_size <= len(data) and data[offset:offset + 4] == b"CMMM":
+        entry_size, entry_hash = struct.unpack_from("<IQ", data, offset + 4)
+        if entry_size < header_size:
+            break
+        width = height = 0
+        if version == 20:
+            id_size, pad_size, data_size = struct.unpack_from("<III", data, offset + 24)
+        elif version == 21:
+            id_size, pad_size, data_size = struct.unpack_from("<III", data, offset + 16)
+        else:
+            id_size, pad_size, data_size, width, height = struct.unpack_from("<IIIII", data, offset + 16)
+        id_start = offset + header_size
+        identifier = data[id_start:id_start + id_size].decode("utf-16-le", errors="replace")
+        entries.append(IconCacheEntry(
+            entry_hash, identifier, width, height, data_size, id_start + id_size + pad_size
+        ))
+        offset += entry_size
+    return version, entries
+
+
+_PATH_IN_TEXT = re.compile(r'[A-Za-z]:\\[^\x00-\x1f"*?<>|]+')
+
+
+def extract_cached_paths(data):
+    """从缓存文件中提取UTF-16路径串（旧版 IconCache.db 以路径记录图标来源）"""
+    paths = set()
+    for start in (0, 1):
+        text = data[start:len(data) - (len(data) - start) % 2].decode("utf-16-le", errors="ignore")
+        for match in _PATH_IN_TEXT.finditer(text):
+            paths.add(os.path.normcase(match.group(0)))
+    return paths
+
+
+class IconCacheState:
+    """从缓存文件副本读取的图标缓存状态（不直接打开资源管理器正在使用的文件）"""
+
+    def __init__(self, cache_files=None):
+        self.entries = 0
+        self.paths = {}  # 图标来源路径 -> 含该路径的缓存文件中最新的修改时间
+        self.errors = []
+        files = icon_cache_files() if cache_files is None else cache_files
+        with tempfile.TemporaryDirectory(prefix="iconfolio_cache_") as temp_dir:
+            for i, path in enumerate(files):
+                try:
+                    copy_path = os.path.join(temp_dir, f"{i}_{os.path.basename(path)}")
+                    shutil.copy2(path, copy_path)
+                    with open(copy_path, 'rb') as f:
+                        data = f.read()
+                    mtime = os.path.getmtime(copy_path)
+                except OSError as e:
+                    self.errors.append(f"{path}：{str(e)}")
+                    continue
+                if data[:4] == b"CMMM":
+                    try:
+                        self.entries += len(parse_icon_cache_db(data)[1])
+                    except (ValueError, struct.error) as e:
+                        self.errors.append(f"{path}：{str(e)}")
+                for cached_path in extract_cached_paths(data):
+                    self.paths[cached_path] = max(self.paths.get(cached_path, 0.0), mtime)
+
+    @property
+    def can_verify(self):
+        """缓存中有路径记录时才能按文件夹判断"""
+        return bool(self.paths)
+
+    def has_icon(self, icon_source, changed_at):
+        """图标来源在缓存中，且含该路径的缓存文件在desktop.ini最后修改之后写入过
+
+        只说明图标已缓存；别名等其他变化看不出来，调用方仍需通知资源管理器重新读取desktop.ini。
+        """
+        cached_at = self.paths.get(os.path.normcase(icon_source))
+        return cached_at is not None and cached_at >= changed_at
+
+
+def read_desktop_ini_icon(ini_path):
+    """读取desktop.ini中的图标来源路径（去掉图标序号）"""
+    with open(ini_path, 'rb') as f:
+        for raw in f:
+            line = raw.decode(DESKTOP_INI_ENCODING, errors="replace").strip()
+            if line.lower().startswith("iconresource="):
+                return line.split("=", 1)[1].rsplit(",", 1)[0].strip()
+    return None
+
+
+def split_cached_folders(current_dir, folders, state):
+    """按缓存状态把文件夹分成（已缓存, 需要刷新）两组；无法判断的归入需要刷新"""
+    cached, missing = [], []
+    for folder in folders:
+        ini_path = os.path.join(current_dir, folder, "desktop.ini")
+        try:
+            icon_source = read_desktop_ini_icon(ini_path)
+            changed_at = os.path.getmtime(ini_path)
+        except OSError:
+            missing.append(folder)
+            continue
+        if icon_source and state.has_icon(icon_source, changed_at):
+            cached.append(folder)
+        else:
+            missing.append(folder)
+    return cached, missing
+
+
 # ------------------------------
 # 文件操作相关函数
 # ------------------------------
@@ -352,368 +723,2413 @@ def ensure_file_writable(file_path):
         return False
 
 
-def get_valid_exes(folder_path):
-    """获取有效EXE文件（返回绝对路径和相对路径的元组）"""
-    exes = []
-    folder_abs = os.path.abspath(folder_path)
-    for root, _, files in os.walk(folder_abs):
-        for file in files:
-            if file.lower().endswith('.exe') and not any(kw in file.lower() for kw in EXCLUDE_KEYWORDS):
-                abs_path = os.path.abspath(os.path.join(root, file))
-                rel_path = os.path.relpath(abs_path, folder_abs)
-                exes.append( (abs_path, rel_path) )
-    # 去重（基于绝对路径）
-    seen = set()
-    return [ (abs_p, rel_p) for abs_p, rel_p in exes if not (abs_p in seen or seen.add(abs_p)) ]
-
-
 # ------------------------------
-# 备份功能
+# 目录快照（会话级缓存）
 # ------------------------------
-def backup_folders_txt():
-    current_dir = OPERATE_DIR
-    txt_path = os.path.join(current_dir, FOLDERS_TXT_NAME)
-    
-    if os.path.exists(txt_path):
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_path = os.path.join(current_dir, f"folders-{timestamp}.txt")
+class FolderEntry:
+    """快照中的一个顶层文件夹"""
+    __slots__ = ("name", "path", "attributes", "has_desktop_ini")
+
+    def __init__(self, name, path, attributes):
+        self.name = name
+        self.path = path
+        self.attributes = attributes  # 文件属性（刷新时加系统属性用，0=未知）
+        self.has_desktop_ini = None  # None=尚未检查
+
+
+class DirectorySnapshot:
+    """操作目录的会话级快照：顶层文件夹、文件属性和 desktop.ini 是否存在
+
+    各菜单操作共用同一份快照，根目录 mtime 变化（增删改名子项）时自动失效；
+    本工具自己在根目录下写状态文件时经 OwnRootWrite 同步 mtime，不会使快照失效；
+    desktop.ini 在子文件夹内，不影响根目录 mtime，由本工具写入/删除时同步更新。
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.mtime_ns = os.stat(root).st_mtime_ns
+        self.folders = []
+        with os.scandir(root) as it:
+            for entry in it:
+                try:
+                    if entry.name.startswith('.') or not entry.is_dir():
+                        continue
+                    # Windows 下属性由 scandir 直接提供，不额外访问磁盘
+                    attributes = getattr(entry.stat(), "st_file_attributes", 0) if os.name == 'nt' else 0
+                except OSError:
+                    continue
+                self.folders.append(FolderEntry(entry.name, entry.path, attributes))
+        self._by_name = {entry.name: entry for entry in self.folders}
+
+    def is_stale(self):
         try:
-            shutil.copy2(txt_path, backup_path)
-            print(f"✅ 已备份 {FOLDERS_TXT_NAME} 到：{backup_path}")
-        except Exception as e:
-            print(f"⚠️  备份失败：{str(e)}，仍将继续操作")
-    else:
-        print("ℹ️  未找到现有配置文件，无需备份")
+            return os.stat(self.root).st_mtime_ns != self.mtime_ns
+        except OSError:
+            return True
+
+    def names(self):
+        return [entry.name for entry in self.folders]
+
+    def get(self, name):
+        return self._by_name.get(name)
+
+    def has_desktop_ini(self, name):
+        """文件夹下是否有 desktop.ini（首次查询时检查并缓存）"""
+        entry = self._by_name.get(name)
+        if entry is None:
+            return False
+        if entry.has_desktop_ini is None:
+            entry.has_desktop_ini = os.path.exists(os.path.join(entry.path, "desktop.ini"))
+        return entry.has_desktop_ini
+
+    def set_desktop_ini(self, name, present):
+        entry = self._by_name.get(name)
+        if entry is not None:
+            entry.has_desktop_ini = present
+
+    def forget_desktop_ini(self):
+        for entry in self.folders:
+            entry.has_desktop_ini = None
+
+
+_SNAPSHOTS = {}
+
+
+def get_folder_snapshot(current_dir, refresh=False):
+    """取操作目录快照，已失效或 refresh=True 时重新读取"""
+    key = os.path.abspath(current_dir)
+    snapshot = _SNAPSHOTS.get(key)
+    if refresh or snapshot is None or snapshot.is_stale():
+        snapshot = DirectorySnapshot(current_dir)
+        _SNAPSHOTS[key] = snapshot
+    return snapshot
+
+
+class OwnRootWrite:
+    """本工具在操作目录下增删改自己的文件（扫描索引、清单、日志、备份库等）时使用
+
+    写入前快照仍有效时，写入后把快照记录的根目录 mtime 更新为新值，自己的写入不会让快照失效；
+    写入前已失效（外部有改动）时不处理，下次取快照照常重新读取。
+    """
+
+    def __init__(self, path):
+        self.root = os.path.dirname(os.path.abspath(path))
+        self.snapshot = None
+
+    def __enter__(self):
+        snapshot = _SNAPSHOTS.get(self.root)
+        if snapshot is not None and not snapshot.is_stale():
+            self.snapshot = snapshot
+        return self
+
+    def __exit__(self, *exc):
+        if self.snapshot is not None:
+            try:
+                self.snapshot.mtime_ns = os.stat(self.root).st_mtime_ns
+            except OSError:
+                pass
 
 
 # ------------------------------
-# folders.txt 生成与更新功能
+# 云同步占位文件识别（OneDrive 按需文件等）
 # ------------------------------
-def generate_folders_txt_interactive():
-    """交互生成folders.txt（存储相对路径）"""
-    try:
-        print("\n" + "-" * 40)
-        print("          交互生成 folders.txt（相对路径版）          ")
-        print("-" * 40)
-        backup_folders_txt()
-        
-        current_dir = OPERATE_DIR
-        txt_path = os.path.join(current_dir, FOLDERS_TXT_NAME)
-        folders = [
-            f for f in os.listdir(current_dir)
-            if os.path.isdir(os.path.join(current_dir, f)) and not f.startswith('.')
-        ]
-        if not folders:
-            print("ℹ️  没有找到可处理的文件夹")
-            return
+FILE_ATTRIBUTE_OFFLINE = 0x1000
+FILE_ATTRIBUTE_RECALL_ON_OPEN = 0x40000
+FILE_ATTRIBUTE_RECALL_ON_DATA_ACCESS = 0x400000
+PLACEHOLDER_ATTRIBUTES = (
+    FILE_ATTRIBUTE_OFFLINE | FILE_ATTRIBUTE_RECALL_ON_OPEN | FILE_ATTRIBUTE_RECALL_ON_DATA_ACCESS
+)
 
-        if os.path.exists(txt_path):
-            confirm = input(f"⚠️  即将覆盖现有 {FOLDERS_TXT_NAME}，是否继续？(y/n)：").strip().lower()
-            if confirm != 'y':
-                print("ℹ️  已取消生成")
-                return
 
-        with open(txt_path, 'w', encoding=FOLDERS_ENCODING) as f:
-            f.write("# 文件夹图标配置文件（存储相对路径）\n")
-            f.write("# 格式：\n")
-            f.write("# [文件夹名]\n")
-            f.write("# LocalizedResourceName=显示名（别名，可修改）\n")
-            f.write("# IconResource=EXE文件相对路径（相对于文件夹本身）\n\n")
-            
-            total = len(folders)
-            for i, folder in enumerate(folders, 1):
-                print(f"\n[{i}/{total}] 处理文件夹：{folder}")
-                folder_path = os.path.join(current_dir, folder)
-                exes = get_valid_exes(folder_path)
-                
-                if not exes:
-                    print(f"   ⚠️  未找到有效EXE，跳过")
-                    continue
-                
-                selected_abs = None
-                selected_rel = None
-                if len(exes) == 1:
-                    abs_path, rel_path = exes[0]
-                    print(f"   找到1个有效EXE（相对路径）：{rel_path}")
-                    print(f"   对应绝对路径：{abs_path}")
-                    selected_abs = abs_path
-                    selected_rel = rel_path
-                else:
-                    print(f"   找到{len(exes)}个有效EXE，请选择：")
-                    for j, (abs_path, rel_path) in enumerate(exes, 1):
-                        print(f"   {j}. 相对路径：{rel_path}")
-                        print(f"      绝对路径：{abs_path}")
-                    while True:
-                        try:
-                            choice = input(f"   请输入序号（1-{len(exes)}，0=跳过）：").strip()
-                            num = int(choice)
-                            if num == 0:
-                                break
-                            if 1 <= num <= len(exes):
-                                selected_abs, selected_rel = exes[num-1]
-                                print(f"   已选择相对路径：{selected_rel}")
-                                break
-                            else:
-                                print(f"   请输入1到{len(exes)}之间的数字")
-                        except ValueError:
-                            print("   请输入有效数字")
-                
-                if selected_rel:
-                    f.write(f"[{folder}]\n")
-                    f.write(f"LocalizedResourceName={folder}\n")
-                    f.write(f"IconResource={selected_rel}\n\n")
-                    print(f"   ✅ 已添加到配置")
-        
-        print(f"\n✅ 成功生成 {txt_path}（编码：{FOLDERS_ENCODING}）")
-    except Exception as e:
-        print(f"❌ 生成失败：{str(e)}")
-    finally:
-        wait_for_space()
+class WindowsAttributeBackend:
+    """读取文件属性：目录项属性由 scandir 直接提供，路径属性用 GetFileAttributes，都不打开文件"""
 
+    def entry_attributes(self, entry):
+        return getattr(entry.stat(follow_symlinks=False), "st_file_attributes", 0)
 
-def generate_folders_txt_auto():
-    """自动生成folders.txt（存储相对路径）"""
-    try:
-        print("\n" + "-" * 40)
-        print("          自动生成 folders.txt（相对路径版）          ")
-        print("-" * 40)
-        backup_folders_txt()
-        
-        current_dir = OPERATE_DIR
-        txt_path = os.path.join(current_dir, FOLDERS_TXT_NAME)
-        folders = [
-            f for f in os.listdir(current_dir)
-            if os.path.isdir(os.path.join(current_dir, f)) and not f.startswith('.')
-        ]
-        if not folders:
-            print("ℹ️  没有找到可处理的文件夹")
-            return
+    def path_attributes(self, path):
+        return win32api.GetFileAttributes(path)
 
-        if os.path.exists(txt_path):
-            confirm = input(f"⚠️  即将覆盖现有 {FOLDERS_TXT_NAME}，是否继续？(y/n)：").strip().lower()
-            if confirm != 'y':
-                print("ℹ️  已取消生成")
-                return
 
-        with open(txt_path, 'w', encoding=FOLDERS_ENCODING) as f:
-            f.write("# 文件夹图标配置文件（自动生成，存储相对路径）\n")
-            f.write("# 格式：\n")
-            f.write("# [文件夹名]\n")
-            f.write("# LocalizedResourceName=显示名\n")
-            f.write("# IconResource=EXE文件相对路径（相对于文件夹本身）\n\n")
-            
-            total = len(folders)
-            processed = 0
-            for folder in folders:
-                folder_path = os.path.join(current_dir, folder)
-                exes = get_valid_exes(folder_path)
-                
-                if exes:
-                    selected_abs, selected_rel = exes[0]
-                    f.write(f"[{folder}]\n")
-                    f.write(f"LocalizedResourceName={folder}\n")
-                    f.write(f"IconResource={selected_rel}\n\n")
-                    processed += 1
-                    print(f"✅ 处理：{folder}（相对路径：{selected_rel}）")
-                else:
-                    print(f"⚠️  跳过：{folder}（无有效EXE）")
-        
-        print(f"\n✅ 成功生成 {txt_path}（编码：{FOLDERS_ENCODING}）")
-    except Exception as e:
-        print(f"❌ 生成失败：{str(e)}")
-    finally:
-        wait_for_space()
+class PlaceholderGuard:
+    """识别云同步占位文件，打开文件前核对，避免触发按需下载
 
+    目录列表中的属性用于候选排序；真正打开文件之前再按路径核对一次，
+    因为扫描索引复用的目录项属性可能已过时（例如文件后来被“释放空间”）。
+    backend 可替换为假实现，在非 Windows 环境下测试。
+    """
 
-def update_folders_txt_interactive():
-    """交互更新folders.txt（仅添加新文件夹）"""
-    try:
-        print("\n" + "-" * 40)
-        print("          交互更新 folders.txt（相对路径版）          ")
-        print("-" * 40)
-        backup_folders_txt()
-        
-        current_dir = OPERATE_DIR
-        txt_path = os.path.join(current_dir, FOLDERS_TXT_NAME)
-        existing_folders = set()
-        
-        if os.path.exists(txt_path):
-            config = configparser.ConfigParser()
-            config.optionxform = str
-            try:
-                with open(txt_path, 'r', encoding=FOLDERS_ENCODING) as f:
-                    config.read_file(f)
-                existing_folders = set(config.sections())
-                print(f"ℹ️  检测到现有配置，包含 {len(existing_folders)} 个文件夹")
-            except Exception as e:
-                print(f"⚠️  读取现有配置失败：{str(e)}，将创建新文件")
-        
-        all_folders = [
-            f for f in os.listdir(current_dir)
-            if os.path.isdir(os.path.join(current_dir, f)) and not f.startswith('.')
-        ]
-        new_folders = [f for f in all_folders if f not in existing_folders]
-        
-        if not new_folders:
-            print("ℹ️  没有检测到新文件夹，无需更新")
-            return
+    def __init__(self, backend=None):
+        self.backend = backend or WindowsAttributeBackend()
+        self.avoided = set()  # 因是占位文件而没有打开的路径
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_placeholder_attributes(attributes):
+        return bool(attributes & PLACEHOLDER_ATTRIBUTES)
+
+    def entry_attributes(self, entry):
+        try:
+            return self.backend.entry_attributes(entry)
+        except OSError:
+            return 0
+
+    def is_placeholder(self, path):
+        """打开文件前核对：是占位文件时记为一次避免的下载并返回True"""
+        try:
+            attributes = self.backend.path_attributes(path)
+        except Exception:
+            return False
+        if not self.is_placeholder_attributes(attributes):
+            return False
+        with self._lock:
+            self.avoided.add(os.path.normcase(os.path.abspath(path)))
+        return True
+
+    def report(self, root=None):
+        """打印并清零本次操作避免的下载次数（指定 root 时只统计该目录下的文件）"""
+        with self._lock:
+            if root is None:
+                reported = set(self.avoided)
+            else:
+                prefix = os.path.join(os.path.normcase(os.path.abspath(root)), "")
+                reported = {path for path in self.avoided if path.startswith(prefix)}
+            count = len(reported)
+            self.avoided -= reported
+        if count:
+            print(f"ℹ️  云同步占位文件：跳过打开 {count} 个，避免了 {count} 次按需下载")
 
-        with open(txt_path, 'a', encoding=FOLDERS_ENCODING) as f:
-            if not os.path.exists(txt_path) or os.path.getsize(txt_path) == 0:
-                f.write("# 文件夹图标配置文件（存储相对路径）\n")
-                f.write("# 格式：\n")
-                f.write("# [文件夹名]\n")
-                f.write("# LocalizedResourceName=显示名\n")
-                f.write("# IconResource=EXE文件相对路径\n\n")
-            elif new_folders:
-                f.write("\n")
-            
-            total = len(new_folders)
-            for i, folder in enumerate(new_folders, 1):
-                print(f"\n[{i}/{total}] 处理新文件夹：{folder}")
-                folder_path = os.path.join(current_dir, folder)
-                exes = get_valid_exes(folder_path)
-                
-                if not exes:
-                    print(f"   ⚠️  未找到有效EXE，跳过")
-                    continue
-                
-                selected_abs = None
-                selected_rel = None
-                if len(exes) == 1:
-                    abs_path, rel_path = exes[0]
-                    print(f"   找到1个有效EXE（相对路径）：{rel_path}")
-                    print(f"   对应绝对路径：{abs_path}")
-                    selected_abs = abs_path
-                    selected_rel = rel_path
-                else:
-                    print(f"   找到{len(exes)}个有效EXE，请选择：")
-                    for j, (abs_path, rel_path) in enumerate(exes, 1):
-                        print(f"   {j}. 相对路径：{rel_path}")
-                        print(f"      绝对路径：{abs_path}")
-                    while True:
-                        try:
-                            choice = input(f"   请输入序号（1-{len(exes)}，0=跳过）：").strip()
-                            num = int(choice)
-                            if num == 0:
-                                break
-                            if 1 <= num <= len(exes):
-                                selected_abs, selected_rel = exes[num-1]
-                                print(f"   已选择相对路径：{selected_rel}")
-                                break
-                            else:
-                                print(f"   请输入1到{len(exes)}之间的数字")
-                        except ValueError:
-                            print("   请输入有效数字")
-                
-                if selected_rel:
-                    f.write(f"[{folder}]\n")
-                    f.write(f"LocalizedResourceName={folder}\n")
-                    f.write(f"IconResource={selected_rel}\n\n")
-                    print(f"   ✅ 已添加到配置")
-        
-        print(f"\n✅ 成功更新 {txt_path}（编码：{FOLDERS_ENCODING}）")
-    except Exception as e:
-        print(f"❌ 更新失败：{str(e)}")
-    finally:
-        wait_for_space()
+
+PLACEHOLDERS = PlaceholderGuard()
 
 
 # ------------------------------
-# desktop.ini 生成与清理功能
+# PE 资源解析（只通过 mmap 读取需要的字节）
 # ------------------------------
-def generate_desktop_ini():
-    """生成desktop.ini"""
-    try:
-        print("\n" + "-" * 60)
-        print("          生成 desktop.ini（直接生成方式）          ")
-        print("-" * 60)
-        current_dir = OPERATE_DIR
-        txt_path = os.path.join(current_dir, FOLDERS_TXT_NAME)
-        
-        if not os.path.exists(txt_path):
-            print(f"❌ 错误：未找到配置文件 {txt_path}")
-            return
+RT_ICON = 3
+RT_GROUP_ICON = 14
+IMAGE_SUBSYSTEM_WINDOWS_GUI = 2
+IMAGE_SUBSYSTEM_WINDOWS_CUI = 3
 
-        config = configparser.ConfigParser(allow_no_value=True)
-        config.optionxform = str  # 保持大小写
-        try:
-            with open(txt_path, 'r', encoding=FOLDERS_ENCODING) as f:
-                config.read_file(f)
-            print(f"✅ 成功读取配置（编码：{FOLDERS_ENCODING}）：{txt_path}")
-        except UnicodeDecodeError:
-            print(f"❌ 编码错误：请将 {FOLDERS_TXT_NAME} 保存为 {FOLDERS_ENCODING} 格式")
-            return
-        except Exception as e:
-            print(f"❌ 读取配置失败：{str(e)}")
-            return
 
-        folder_names = config.sections()
-        total = len(folder_names)
-        if total == 0:
-            print(f"❌ 配置文件中没有任何文件夹")
-            return
+class PeResources:
+    """PE文件的资源目录：按类型列出资源项，并按RVA读取资源数据"""
 
-        processed = 0
-        for folder_name in folder_names:
-            print(f"\n{'-'*40}")
-            print(f"📂 正在处理文件夹：[{folder_name}]")
-            
-            folder_path = os.path.join(current_dir, folder_name)
-            folder_abs_path = os.path.abspath(folder_path)
-            print(f"   文件夹绝对路径：{folder_abs_path}")
-            if not os.path.isdir(folder_abs_path):
-                print(f"   ⚠️  跳过：文件夹不存在")
-                continue
-            
+    def __init__(self, data):
+        self.data = data
+        self.subsystem = 0
+        self.sections = []  # (虚拟地址, 虚拟大小, 文件偏移, 文件大小)
+        self.resource_base = None  # 资源目录的文件偏移
+        self._parse_headers()
+
+    def _u16(self, offset):
+        return struct.unpack_from("<H", self.data, offset)[0]
+
+    def _u32(self, offset):
+        return struct.unpack_from("<I", self.data, offset)[0]
+
+    def _parse_headers(self):
+        data = self.data
+        if data[:2] != b"MZ":
+            raise ValueError("不是PE文件")
+        pe_offset = self._u32(0x3C)
+        if data[pe_offset:pe_offset + 4] != b"PE\0\0":
+            raise ValueError("不是PE文件")
+        coff = pe_offset + 4
+        section_count = self._u16(coff + 2)
+        optional_size = self._u16(coff + 16)
+        optional = coff + 20
+        magic = self._u16(optional)
+        if magic not in (0x10B, 0x20B):
+            raise ValueError("未知的可选头格式")
+        self.subsystem = self._u16(optional + 68)
+        dir_count_offset, dirs_offset = (optional + 92, optional + 96) if magic == 0x10B else (optional + 108, optional + 112)
+
+        section_table = optional + optional_size
+        for i in range(section_count):
+            entry = section_table + i * 40
+            virtual_size, virtual_addr, raw_size, raw_ptr = struct.unpack_from("<IIII", data, entry + 8)
+            self.sections.append((virtual_addr, max(virtual_size, raw_size), raw_ptr, raw_size))
+
+        if self._u32(dir_count_offset) > 2:
+            resource_rva = self._u32(dirs_offset + 2 * 8)
+            if resource_rva:
+                self.resource_base = self.rva_to_offset(resource_rva)
+
+    def rva_to_offset(self, rva):
+        for virtual_addr, virtual_size, raw_ptr, raw_size in self.sections:
+            if virtual_addr <= rva < virtual_addr + virtual_size:
+                offset = rva - virtual_addr
+                if offset >= raw_size:
+                    break
+                return raw_ptr + offset
+        raise ValueError(f"RVA 0x{rva:x} 不在任何节中")
+
+    def _directory(self, offset):
+        """读取一级资源目录，产出（名称或ID, 是否子目录, 相对资源基址的偏移）"""
+        named, ids = struct.unpack_from("<HH", self.data, self.resource_base + offset + 12)
+        entry = self.resource_base + offset + 16
+        for i in range(named + ids):
+            name, target = struct.unpack_from("<II", self.data, entry + i * 8)
+            yield name, bool(target & 0x80000000), target & 0x7FFFFFFF
+
+    def entries(self, resource_type):
+        """列出某类型的全部资源，按目录顺序返回 [(名称或ID, 数据RVA, 大小)]（每项取第一种语言）"""
+        if self.resource_base is None:
+            return []
+        result = []
+        for type_id, is_dir, type_offset in self._directory(0):
+            if type_id != resource_type or not is_dir:
+                continue
+            for name, name_is_dir, name_offset in self._directory(type_offset):
+                offset = name_offset
+                if name_is_dir:
+                    languages = list(self._directory(name_offset))
+                    if not languages:
+                        continue
+                    offset = languages[0][2]
+                data_rva, size = struct.unpack_from("<II", self.data, self.resource_base + offset)
+                result.append((name, data_rva, size))
+        return result
+
+    def read(self, data_rva, size):
+        offset = self.rva_to_offset(data_rva)
+        if offset + size > len(self.data):
+            raise ValueError("资源数据越界")
+        return self.data[offset:offset + size]
+
+
+def parse_group_icon(group_data):
+    """解析 GRPICONDIR，返回 [(宽, 高, 颜色数, 位平面, 位深, 字节数, 图标ID)]"""
+    _, res_type, count = struct.unpack_from("<HHH", group_data, 0)
+    if res_type != 1:
+        raise ValueError("不是图标组资源")
+    entries = []
+    for i in range(count):
+        width, height, colors, _, planes, bit_count, size, icon_id = struct.unpack_from(
+            "<BBBBHHIH", group_data, 6 + i * 14
+        )
+        entries.append((width or 256, height or 256, colors, planes, bit_count, size, icon_id))
+    return entries
+
+
+class PeIconInfo:
+    """EXE的图标概况"""
+    __slots__ = ("has_icon_group", "icon_sizes", "subsystem")
+
+    def __init__(self, has_icon_group=False, icon_sizes=(), subsystem=0):
+        self.has_icon_group = has_icon_group
+        self.icon_sizes = list(icon_sizes)
+        self.subsystem = subsystem
+
+    def to_list(self):
+        return [self.has_icon_group, self.icon_sizes, self.subsystem]
+
+    @classmethod
+    def from_list(cls, values):
+        return cls(*values)
+
+
+def open_pe_mmap(path):
+    """只读方式 mmap 整个文件（按需分页，只有实际访问的字节会被读入）"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < 64:
+            raise ValueError("文件过小")
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def read_pe_icon_info(path):
+    """读取EXE的图标组、图标尺寸和子系统；不是有效PE时返回None"""
+    try:
+        with open_pe_mmap(path) as data:
+            resources = PeResources(data)
+            sizes = set()
+            groups = resources.entries(RT_GROUP_ICON)
+            if groups:
+                # 只看第一个图标组（desktop.ini 中的 ,0 就是它）
+                _, data_rva, size = groups[0]
+                for width, *_ in parse_group_icon(resources.read(data_rva, size)):
+                    sizes.add(width)
+            return PeIconInfo(bool(groups), sorted(sizes), resources.subsystem)
+    except (OSError, ValueError, struct.error, IndexError):
+        return None
+
+
+def extract_icon_group(path, group_index=0):
+    """从EXE中提取一个图标组，拼成多分辨率 .ico 文件内容；没有图标组时返回None
+
+    图标组（RT_GROUP_ICON）的目录项是14字节、以图标ID结尾，
+    .ico 文件的目录项是16字节、以图像数据偏移结尾，图像数据本身（RT_ICON）原样复制。
+    """
+    with open_pe_mmap(path) as data:
+        resources = PeResources(data)
+        groups = resources.entries(RT_GROUP_ICON)
+        if len(groups) <= group_index:
+            return None
+        _, data_rva, size = groups[group_index]
+        group = parse_group_icon(resources.read(data_rva, size))
+        icons = {icon_id: (rva, icon_size) for icon_id, rva, icon_size in resources.entries(RT_ICON)}
+
+        images = []
+        for width, height, colors, planes, bit_count, _, icon_id in group:
+            if icon_id in icons:
+                images.append((width, height, colors, planes, bit_count, resources.read(*icons[icon_id])))
+    if not images:
+        return None
+
+    header = struct.pack("<HHH", 0, 1, len(images))
+    directory = b""
+    offset = 6 + 16 * len(images)
+    for width, height, colors, planes, bit_count, image in images:
+        directory += struct.pack(
+            "<BBBBHHII", width % 256, height % 256, colors, 0, planes, bit_count, len(image), offset
+        )
+        offset += len(image)
+    return header + directory + b"".join(image[-1] for image in images)
+
+
+_PE_INFO_CACHE = {}
+_PE_INFO_LOCK = threading.Lock()
+
+
+def get_pe_icon_info(path, size=None, mtime_ns=None, index=None):
+    """带缓存的 read_pe_icon_info：按文件大小和 mtime 判断是否需要重新解析"""
+    if size is None or mtime_ns is None:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        size, mtime_ns = st.st_size, st.st_mtime_ns
+    key = (path, size, mtime_ns)
+    with _PE_INFO_LOCK:
+        cached = key in _PE_INFO_CACHE
+        info = _PE_INFO_CACHE.get(key)
+    if not cached:
+        if index is not None:
+            cached, info = index.get_pe(path, size, mtime_ns)
+        if not cached:
+            if PLACEHOLDERS.is_placeholder(path):
+                # 下载后大小和 mtime 不变，不能缓存为“无图标”
+                return None
+            info = read_pe_icon_info(path)
+        with _PE_INFO_LOCK:
+            _PE_INFO_CACHE[key] = info
+    if index is not None:
+        index.put_pe(path, size, mtime_ns, info)
+    return info
+
+
+def exe_rank_score(folder_name, rel_path, depth, info):
+    """候选EXE评分：有图标组 > GUI程序 > 图标尺寸大 > 名称像文件夹 > 层级浅"""
+    score = -10 * depth
+    if info is not None:
+        if info.has_icon_group:
+            score += 1000
+        if info.subsystem == IMAGE_SUBSYSTEM_WINDOWS_GUI:
+            score += 100
+        if info.icon_sizes:
+            score += min(max(info.icon_sizes), 256) // 4
+    stem = os.path.splitext(os.path.basename(rel_path))[0].lower()
+    folder = folder_name.lower()
+    if stem and (stem in folder or folder in stem):
+        score += 50
+    return score
+
+
+# ------------------------------
+# EXE 扫描与排除规则
+# ------------------------------
+def _compile_patterns(patterns):
+    """把通配符列表编译为（按名称匹配, 按相对路径匹配）两个正则"""
+    name_parts, path_parts = [], []
+    for pattern in patterns:
+        regex = fnmatch.translate(pattern.strip("/"))
+        (path_parts if "/" in pattern.strip("/") else name_parts).append(regex)
+    name_re = re.compile("|".join(name_parts), re.IGNORECASE) if name_parts else None
+    path_re = re.compile("|".join(path_parts), re.IGNORECASE) if path_parts else None
+    return name_re, path_re
+
+
+class ScanRules:
+    """编译后的文件/目录排除规则
+
+    规则文件语法（类似 .gitignore，不区分大小写）：
+      # 注释
+      *crash*.exe      排除匹配的文件
+      redist/          以 / 结尾表示目录，匹配的目录整棵剪枝
+      GameA/tools/     含 / 的规则按相对操作目录的路径匹配
+      !launcher.exe    以 ! 开头表示重新包含（优先于排除）
+    """
+
+    def __init__(self, lines=()):
+        self.lines = list(lines)
+        self.signature = hashlib.sha1("\n".join(self.lines).encode('utf-8')).hexdigest()
+        buckets = {(False, False): [], (False, True): [], (True, False): [], (True, True): []}
+        for line in self.lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            include = line.startswith("!")
+            if include:
+                line = line[1:].strip()
+            is_dir = line.endswith("/")
+            if line.strip("/"):
+                buckets[(is_dir, include)].append(line.replace("\\", "/"))
+        self._file_exclude = _compile_patterns(buckets[(False, False)])
+        self._file_include = _compile_patterns(buckets[(False, True)])
+        self._dir_exclude = _compile_patterns(buckets[(True, False)])
+        self._dir_include = _compile_patterns(buckets[(True, True)])
+
+    @classmethod
+    def default_lines(cls):
+        """内置默认规则（由 EXCLUDE_KEYWORDS 和 PRUNE_DIRS 转换）"""
+        return [f"*{kw}*" for kw in EXCLUDE_KEYWORDS] + [f"{d}/" for d in PRUNE_DIRS]
+
+    @staticmethod
+    def _matches(compiled, name, rel_path):
+        name_re, path_re = compiled
+        if name_re is not None and name_re.match(name):
+            return True
+        return path_re is not None and path_re.match(rel_path.replace(os.sep, "/"))
+
+    def skip_file(self, name, rel_path):
+        """文件是否被排除"""
+        return bool(self._matches(self._file_exclude, name, rel_path)
+                    and not self._matches(self._file_include, name, rel_path))
+
+    def skip_dir(self, name, rel_path):
+        """目录是否被剪枝（不进入）"""
+        return bool(self._matches(self._dir_exclude, name, rel_path)
+                    and not self._matches(self._dir_include, name, rel_path))
+
+
+_SCAN_RULES_CACHE = {}
+
+
+def load_scan_rules(current_dir, encoding=None):
+    """读取操作目录下的规则文件（叠加在默认规则之后），按修改时间缓存"""
+    encoding = encoding or FOLDERS_ENCODING
+    ignore_path = os.path.join(current_dir, IGNORE_FILE_NAME) if current_dir else ""
+    try:
+        mtime = os.stat(ignore_path).st_mtime_ns
+    except OSError:
+        mtime = None
+    cached = _SCAN_RULES_CACHE.get((ignore_path, encoding))
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    lines = ScanRules.default_lines()
+    if mtime is not None:
+        try:
+            with open(ignore_path, 'r', encoding=encoding) as f:
+                lines += f.read().splitlines()
+        except Exception as e:
+            print(f"⚠️  读取 {IGNORE_FILE_NAME} 失败：{str(e)}，使用默认规则")
+    rules = ScanRules(lines)
+    _SCAN_RULES_CACHE[(ignore_path, encoding)] = (mtime, rules)
+    return rules
+
+
+class ScanIndex:
+    """EXE扫描索引：按目录 mtime 记录每个目录的子目录和EXE（含大小和文件属性）
+
+    目录的 mtime 只在其直接子项增删改名时变化，所以 mtime 未变的目录
+    直接复用记录，只需一次 stat，不再 scandir；规则变化时整个索引作废。
+    """
+    VERSION = 2
+
+    def __init__(self, path, signature):
+        self.path = path
+        self.signature = signature
+        self.folders = {}
+        self.pe = {}  # 相对操作目录的EXE路径 -> [大小, mtime_ns, 图标信息]
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, current_dir, rules=None):
+        """读取操作目录下的索引文件"""
+        rules = rules or load_scan_rules(current_dir)
+        index = cls(os.path.join(current_dir, SCAN_INDEX_NAME), rules.signature)
+        data = load_json(index.path, {})
+        if data.get("version") == cls.VERSION and data.get("rules") == rules.signature:
+            index.folders = data.get("folders", {})
+        if data.get("version") == cls.VERSION:
+            index.pe = data.get("pe", {})
+        return index
+
+    def _pe_key(self, path):
+        return os.path.relpath(path, os.path.dirname(self.path)).replace(os.sep, "/")
+
+    def get_pe(self, path, size, mtime_ns):
+        """返回（是否命中, PeIconInfo或None）；未缓存或文件已变化时视为未命中"""
+        with self._lock:
+            record = self.pe.get(self._pe_key(path))
+        if record and record[0] == size and record[1] == mtime_ns:
+            return True, PeIconInfo.from_list(record[2]) if record[2] is not None else None
+        return False, None
+
+    def put_pe(self, path, size, mtime_ns, info):
+        with self._lock:
+            self.pe[self._pe_key(path)] = [size, mtime_ns, info.to_list() if info else None]
+
+    def scan_dir(self, folder_name, rel_dir, dir_path, scan_func):
+        """返回目录的（子目录名列表, [[EXE名, 大小, mtime_ns, 属性], ...]），mtime 未变时直接复用"""
+        key = rel_dir.replace(os.sep, "/")
+        try:
+            mtime = os.stat(dir_path).st_mtime_ns
+        except OSError:
+            return [], []
+        with self._lock:
+            nodes = self.folders.setdefault(folder_name, {})
+            node = nodes.get(key)
+            if node and node["m"] == mtime:
+                self.hits += 1
+                return node["d"], node["e"]
+
+        subdirs, exes = scan_func()
+        with self._lock:
+            self.misses += 1
+            # 已删除的子目录连同其下记录一并清除
+            if node:
+                for removed in set(node["d"]) - set(subdirs):
+                    prefix = f"{key}/{removed}" if key else removed
+                    for stale in [k for k in nodes if k == prefix or k.startswith(prefix + "/")]:
+                        del nodes[stale]
+            nodes[key] = {"m": mtime, "d": subdirs, "e": exes}
+        return subdirs, exes
+
+    def prune(self, existing_folders):
+        """移除已不存在的顶层文件夹"""
+        existing = set(existing_folders)
+        with self._lock:
+            for name in [n for n in self.folders if n not in existing]:
+                del self.folders[name]
+            for key in [k for k in self.pe if k.split("/")[0] not in existing]:
+                del self.pe[key]
+
+    def save(self):
+        try:
+            with self._lock:
+                save_json_atomic(self.path, {
+                    "version": self.VERSION,
+                    "rules": self.signature,
+                    "folders": self.folders,
+                    "pe": self.pe,
+                })
+        except Exception as e:
+            print(f"⚠️  保存扫描索引失败：{str(e)}")
+
+    def summary(self):
+        return f"扫描索引：复用 {self.hits} 个目录，重新扫描 {self.misses} 个目录"
+
+
+def _scan_one_dir(dir_path, rel_dir, folder_name, rules, with_stat=False):
+    """scandir 单个目录，返回（未剪枝的子目录名列表, [[EXE名, 大小, mtime_ns, 属性], ...]）"""
+    try:
+        with os.scandir(dir_path) as it:
+            entries = sorted(it, key=lambda e: e.name.lower())
+    except OSError:
+        return [], []
+
+    subdirs, exes = [], []
+    for entry in entries:
+        rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                if not rules.skip_dir(entry.name, os.path.join(folder_name, rel_path)):
+                    subdirs.append(entry.name)
+                continue
+            if not entry.is_file():
+                continue
+            if (entry.name.lower().endswith('.exe')
+                    and not rules.skip_file(entry.name, os.path.join(folder_name, rel_path))):
+                # 属性在 Windows 下由 scandir 直接提供，不额外访问磁盘，也不会触发云文件下载
+                attributes = PLACEHOLDERS.entry_attributes(entry)
+                if SKIP_PLACEHOLDER_EXES and PLACEHOLDERS.is_placeholder_attributes(attributes):
+                    continue
+                if with_stat:
+                    st = entry.stat()
+                    exes.append([entry.name, st.st_size, st.st_mtime_ns, attributes])
+                else:
+                    exes.append([entry.name, None, None, attributes])
+        except OSError:
+            continue
+    return subdirs, exes
+
+
+def iter_exe_candidates(folder_path, max_depth=None, rules=None, index=None):
+    """广度优先扫描有效EXE，逐个产出（绝对路径, 相对路径, 深度, 大小, mtime_ns, 文件属性）
+
+    基于 os.scandir 复用 DirEntry 的类型信息，不做额外 stat；
+    max_depth 为 None 时不限深度，0 表示只扫描文件夹本身；
+    命中 rules 剪枝规则的目录不会进入（默认读取上级目录的规则文件）；
+    传入 index 时未变化的目录直接复用索引。
+    """
+    folder_abs = os.path.abspath(folder_path)
+    if rules is None:
+        rules = load_scan_rules(os.path.dirname(folder_abs))
+    folder_name = os.path.basename(folder_abs)
+    queue = collections.deque([(folder_abs, "", 0)])
+    while queue:
+        dir_path, rel_dir, depth = queue.popleft()
+        if index is not None:
+            subdirs, exes = index.scan_dir(
+                folder_name, rel_dir, dir_path,
+                lambda: _scan_one_dir(dir_path, rel_dir, folder_name, rules, with_stat=True)
+            )
+        else:
+            subdirs, exes = _scan_one_dir(dir_path, rel_dir, folder_name, rules)
+
+        for name, size, mtime_ns, attributes in exes:
+            rel_path = os.path.join(rel_dir, name) if rel_dir else name
+            yield os.path.join(dir_path, name), rel_path, depth, size, mtime_ns, attributes
+
+        if max_depth is None or depth < max_depth:
+            for name in subdirs:
+                rel_sub = os.path.join(rel_dir, name) if rel_dir else name
+                queue.append((os.path.join(dir_path, name), rel_sub, depth + 1))
+
+
+def get_valid_exes(folder_path, max_depth=EXE_SCAN_MAX_DEPTH, limit=None, rules=None, index=None,
+                   rank=None):
+    """获取有效EXE文件（返回绝对路径和相对路径的元组）
+
+    rank 为真（默认取 RANK_EXES）时按内嵌图标质量排序，否则按广度优先顺序（浅层优先）；
+    limit 为 N 时尽早停止扫描：排序模式下找到 N 个带图标组的EXE后只扫完当前层。
+    排序模式下云同步占位EXE不会被打开读取，统一排在本地EXE之后；
+    最多读取 RANK_MAX_CANDIDATES 个候选的PE信息，其余候选不读取，按广度优先顺序排在最后。
+    """
+    candidates = iter_exe_candidates(folder_path, max_depth=max_depth, rules=rules, index=index)
+    if not (RANK_EXES if rank is None else rank):
+        if limit is not None:
+            candidates = itertools.islice(candidates, limit)
+        return [(abs_path, rel_path) for abs_path, rel_path, *_ in candidates]
+
+    folder_name = os.path.basename(os.path.abspath(folder_path))
+    cap = RANK_MAX_CANDIDATES if limit is None else max(limit, RANK_MAX_CANDIDATES)
+    scored = []
+    unranked = []
+    with_icon = 0
+    stop_depth = None
+    for abs_path, rel_path, depth, _, _, attributes in candidates:
+        if stop_depth is not None and depth > stop_depth:
+            break
+        if len(scored) >= cap:
+            if limit is not None:
+                break  # 已排序的候选足够取前 limit 个
+            unranked.append((abs_path, rel_path))
+            continue
+        placeholder = PLACEHOLDERS.is_placeholder_attributes(attributes)
+        # 不用索引中记录的大小和 mtime：原地覆盖EXE不会改变所在目录的 mtime，记录可能已过时
+        info = get_pe_icon_info(abs_path, index=index)
+        score = exe_rank_score(folder_name, rel_path, depth, info)
+        scored.append((placeholder, -score, len(scored), abs_path, rel_path))
+        if info is not None and info.has_icon_group and not placeholder:
+            with_icon += 1
+        if limit is not None and stop_depth is None and (
+                with_icon >= limit or len(scored) >= cap):
+            stop_depth = depth
+    scored.sort()
+    return [(abs_path, rel_path) for *_, abs_path, rel_path in scored[:limit]] + unranked
+
+
+def scan_folders_parallel(current_dir, folders, workers=SCAN_WORKERS, **scan_kwargs):
+    """并行扫描多个顶层文件夹，按输入顺序逐个产出（文件夹, EXE列表, 错误, 耗时秒）
+
+    扫描受磁盘/网络延迟限制而非CPU，线程池即可重叠等待；
+    单个文件夹出错只影响它自己，慢的文件夹不会阻塞其余文件夹的扫描。
+    """
+    def scan(folder):
+        start = time.perf_counter()
+        try:
+            exes = get_valid_exes(os.path.join(current_dir, folder), **scan_kwargs)
+            return folder, exes, None, time.perf_counter() - start
+        except Exception as e:
+            return folder, [], e, time.perf_counter() - start
+
+    if workers <= 1:
+        for folder in folders:
+            yield scan(folder)
+        return
+
+    with concurrent_futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(scan, folder) for folder in folders]
+        for future in futures:
+            yield future.result()
+
+
+class ExePrefetcher:
+    """交互模式的EXE预取器：用户在当前文件夹做选择时，后台提前扫描后面几个文件夹"""
+
+    def __init__(self, current_dir, folders, lookahead=PREFETCH_AHEAD, **scan_kwargs):
+        self.current_dir = current_dir
+        self.folders = list(folders)
+        self.lookahead = max(0, lookahead)
+        self.scan_kwargs = scan_kwargs
+        self._pool = concurrent_futures.ThreadPoolExecutor(max_workers=max(1, self.lookahead))
+        self._futures = {}
+
+    def _submit(self, i):
+        if i < len(self.folders) and i not in self._futures:
+            folder_path = os.path.join(self.current_dir, self.folders[i])
+            self._futures[i] = self._pool.submit(get_valid_exes, folder_path, **self.scan_kwargs)
+
+    def get(self, i):
+        """取第 i 个文件夹（从0开始）的EXE列表，并预约后面 lookahead 个"""
+        for j in range(i, i + self.lookahead + 1):
+            self._submit(j)
+        return self._futures.pop(i).result()
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ------------------------------
+# 备份功能
+# ------------------------------
+_LEGACY_BACKUP = re.compile(r"^folders-(\d{8}_\d{6})\.txt$", re.IGNORECASE)
+
+
+class BackupStore:
+    """隐藏目录中的配置备份库：内容按SHA1去重、gzip压缩保存，按份数轮换
+
+    index.json 按时间顺序记录每份备份（时间, 文件名, 哈希, 原始大小）；
+    内容与最近一份相同时不再备份，多份备份内容相同时只存一份压缩数据。
+    从旧版 folders-时间.txt 迁移来的备份不参与轮换，只能手动删除。
+    """
+    VERSION = 1
+
+    def __init__(self, current_dir, keep=BACKUP_KEEP):
+        self.current_dir = current_dir
+        self.dir = os.path.join(current_dir, BACKUP_DIR_NAME)
+        self.index_path = os.path.join(self.dir, "index.json")
+        self.keep = keep
+        data = load_json(self.index_path, {})
+        self.entries = data.get("entries", []) if data.get("version") == self.VERSION else []
+
+    def _blob_path(self, digest):
+        return os.path.join(self.dir, digest + ".gz")
+
+    def _ensure_dir(self):
+        if not os.path.isdir(self.dir):
+            with OwnRootWrite(self.dir):
+                os.makedirs(self.dir)
+            win32api.SetFileAttributes(self.dir, win32con.FILE_ATTRIBUTE_HIDDEN)
+
+    def _add(self, name, data, timestamp, legacy=False):
+        """记录一份备份；与同名文件的最近一份内容相同时跳过，返回是否新增
+
+        迁移来的旧版备份总是单独记录（只跳过已迁移过的同一份），
+        否则与之相同的普通备份轮换掉后内容就丢了；压缩数据按哈希共用，不多占空间。
+        """
+        digest = hashlib.sha1(data).hexdigest()
+        if legacy:
+            if any(entry.get("legacy") and entry["time"] == timestamp and entry["hash"] == digest
+                   for entry in self.entries):
+                return False
+        else:
+            latest = next((entry for entry in reversed(self.entries) if entry["name"] == name), None)
+            if latest and latest["hash"] == digest:
+                return False
+        self._ensure_dir()
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            temp_path = blob_path + ".tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(gzip.compress(data, mtime=0))
+            os.replace(temp_path, blob_path)
+        entry = {"time": timestamp, "name": name, "hash": digest, "size": len(data)}
+        if legacy:
+            entry["legacy"] = True
+        self.entries.append(entry)
+        self.entries.sort(key=lambda entry: entry["time"])
+        return True
+
+    def _rotate(self):
+        """只保留最近 keep 份（迁移来的旧版备份不计入），删除不再被引用的压缩数据"""
+        rotating = [entry for entry in self.entries if not entry.get("legacy")]
+        if len(rotating) > self.keep:
+            dropped = {id(entry) for entry in rotating[:len(rotating) - self.keep]}
+            self.entries = [entry for entry in self.entries if id(entry) not in dropped]
+        used = {entry["hash"] + ".gz" for entry in self.entries}
+        if os.path.isdir(self.dir):
+            for name in os.listdir(self.dir):
+                if name.endswith(".gz") and name not in used:
+                    os.remove(os.path.join(self.dir, name))
+
+    def _save(self):
+        self._ensure_dir()
+        save_json_atomic(self.index_path, {"version": self.VERSION, "entries": self.entries})
+
+    def backup(self, path):
+        """备份一个配置文件，返回是否新增了备份（内容未变化时为False）"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        added = self._add(os.path.basename(path), data, timestamp)
+        if added:
+            self._rotate()
+            self._save()
+        return added
+
+    def migrate_legacy(self):
+        """把旧版散落在操作目录中的 folders-时间.txt 收进备份库并删除原文件，返回迁移数
+
+        迁移来的备份不参与轮换；索引保存成功后才删除原文件，内容全部保留在备份库中。
+        """
+        legacy = sorted(
+            (match.group(1), name) for name in os.listdir(self.current_dir)
+            for match in [_LEGACY_BACKUP.match(name)] if match
+        )
+        for timestamp, name in legacy:
+            path = os.path.join(self.current_dir, name)
+            with open(path, 'rb') as f:
+                self._add(FOLDERS_TXT_NAME, f.read(), timestamp, legacy=True)
+        if legacy:
+            self._save()
+            with OwnRootWrite(self.index_path):
+                for _, name in legacy:
+                    os.remove(os.path.join(self.current_dir, name))
+        return len(legacy)
+
+    def read(self, entry):
+        with open(self._blob_path(entry["hash"]), 'rb') as f:
+            return gzip.decompress(f.read())
+
+    def restore(self, entry):
+        """恢复一份备份（先备份当前内容，可再恢复回来），返回目标路径"""
+        target = os.path.join(self.current_dir, entry["name"])
+        data = self.read(entry)
+        if os.path.exists(target):
+            self.backup(target)
+        temp_path = target + ".restore.tmp"
+        with OwnRootWrite(target):
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, target)
+        return target
+
+
+def backup_folders_txt(path=None, current_dir=None):
+    """把配置文件（默认为当前使用的 folders.txt 或配置库）备份到备份库"""
+    current_dir = current_dir or OPERATE_DIR
+    path = path or config_path(current_dir)
+    name = os.path.basename(path)
+    try:
+        store = BackupStore(RootContext.of(current_dir).root)
+        migrated = store.migrate_legacy()
+        if migrated:
+            print(f"ℹ️  已将 {migrated} 个旧版备份 folders-*.txt 收入 {BACKUP_DIR_NAME}（全部保留，不参与轮换）")
+        if not os.path.exists(path):
+            print("ℹ️  未找到现有配置文件，无需备份")
+        elif store.backup(path):
+            print(f"✅ 已备份 {name} 到 {BACKUP_DIR_NAME}（共 {len(store.entries)} 份，最多保留 {BACKUP_KEEP} 份）")
+        else:
+            print(f"ℹ️  {name} 与上次备份相同，无需再备份")
+    except Exception as e:
+        print(f"⚠️  备份失败：{str(e)}，仍将继续操作")
+
+
+def restore_backup():
+    """列出备份并恢复选中的一份"""
+    try:
+        print("\n" + "-" * 40)
+        print("          从备份恢复配置          ")
+        print("-" * 40)
+        store = BackupStore(OPERATE_DIR)
+        migrated = store.migrate_legacy()
+        if migrated:
+            print(f"ℹ️  已将 {migrated} 个旧版备份 folders-*.txt 收入 {BACKUP_DIR_NAME}（全部保留，不参与轮换）")
+        entries = list(reversed(store.entries))
+        if not entries:
+            print("ℹ️  还没有任何备份")
+            return
+        for i, entry in enumerate(entries, 1):
+            stamp = datetime.datetime.strptime(entry["time"], "%Y%m%d_%H%M%S").strftime("%Y-%m-%d %H:%M:%S")
+            print(f"   {i}. {stamp}  {entry['name']}（{entry['size']} 字节）" + ("  [旧版备份]" if entry.get("legacy") else ""))
+        choice = input(f"请输入要恢复的序号（1-{len(entries)}，0=取消）：").strip()
+        if not choice.isdigit() or not 1 <= int(choice) <= len(entries):
+            print("ℹ️  已取消恢复")
+            return
+        target = store.restore(entries[int(choice) - 1])
+        print(f"✅ 已恢复 {target}（恢复前的内容已另存为一份备份）")
+    except Exception as e:
+        print(f"❌ 恢复失败：{str(e)}")
+    finally:
+        wait_for_space()
+
+
+# ------------------------------
+# folders.txt 流式读写
+# ------------------------------
+class FolderRecord:
+    """folders.txt 中的一节：[文件夹名]、别名、图标相对路径和标题所在行号"""
+    __slots__ = ("section", "alias", "icon", "line")
+
+    def __init__(self, section, alias=None, icon="", line=0):
+        self.section = section
+        self.alias = alias  # None=未配置，使用文件夹名
+        self.icon = icon
+        self.line = line
+
+
+class FoldersTxtReader:
+    """逐行流式读取folders.txt，每节只保留一条紧凑记录，不把整个文件载入内存
+
+    出错只影响所在的节：无法解码或重复的节整节跳过，节外的配置行和无法识别的行忽略，
+    都记入 errors（行号, 说明），其余各节照常读取。
+    offsets 记录每节标题行的（字节偏移, 行号），read_section 可直接跳到某一节读取。
+    """
+
+    def __init__(self, path, encoding=None):
+        self.path = path
+        self.encoding = encoding or FOLDERS_ENCODING
+        self.errors = []
+        self.offsets = {}
+
+    def _lines(self, offset=0, line_no=1):
+        """产出（行号, 字节偏移, 原始字节, 解码后的行或None）；解码失败时为None"""
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for raw in f:
+                try:
+                    text = raw.decode(self.encoding)
+                except UnicodeDecodeError:
+                    text = None
+                else:
+                    if line_no == 1:
+                        text = text.lstrip("\ufeff")
+                yield line_no, offset, raw, text
+                offset += len(raw)
+                line_no += 1
+
+    @staticmethod
+    def _header(text):
+        text = text.strip()
+        if text.startswith("[") and text.endswith("]"):
+            return text[1:-1].strip()
+        return None
+
+    def _parse(self, lines, single=False):
+        record = None
+        bad = False  # 当前节有错误，整节跳过
+        for line_no, offset, raw, text in lines:
+            if text is None:
+                self.errors.append((line_no, f"无法用 {self.encoding} 解码"))
+                if raw.lstrip().startswith(b"["):
+                    # 标题行本身无法解码：上一节已完整，本节整节跳过
+                    if record is not None and not bad:
+                        yield record
+                    if single and record is not None:
+                        return
+                    record = None
+                bad = True
+                continue
+            stripped = text.strip()
+            if not stripped or stripped[0] in "#;":
+                continue
+            section = self._header(stripped)
+            if section is not None:
+                if record is not None and not bad:
+                    yield record
+                if single and record is not None:
+                    return
+                bad = False
+                if section in self.offsets and self.offsets[section][0] != offset:
+                    self.errors.append((line_no, f"重复的文件夹 [{section}]，已忽略"))
+                    record, bad = None, True
+                    continue
+                self.offsets[section] = (offset, line_no)
+                record = FolderRecord(section, line=line_no)
+                continue
+            if record is None:
+                if not bad:
+                    self.errors.append((line_no, "配置项不在任何 [文件夹名] 之下，已忽略"))
+                continue
+            delimiter = "=" if "=" in stripped else ":"
+            key, sep, value = stripped.partition(delimiter)
+            if not sep:
+                self.errors.append((line_no, f"无法识别的行：{stripped}"))
+                continue
+            key = key.strip().lower()
+            if key == "localizedresourcename":
+                record.alias = value.strip()
+            elif key == "iconresource":
+                record.icon = value.strip()
+        if record is not None and not bad:
+            yield record
+
+    def __iter__(self):
+        self.errors = []
+        self.offsets = {}
+        return self._parse(self._lines())
+
+    def sections(self):
+        """只扫描标题行，返回节名列表（同时建立字节偏移索引）"""
+        self.offsets = {}
+        names = []
+        for line_no, offset, raw, text in self._lines():
+            section = self._header(text) if text else None
+            if section is not None and section not in self.offsets:
+                self.offsets[section] = (offset, line_no)
+                names.append(section)
+        return names
+
+    def read_section(self, name):
+        """按字节偏移索引直接读取一节，不存在时返回None"""
+        if not self.offsets:
+            self.sections()
+        if name not in self.offsets:
+            return None
+        records = list(self._parse(self._lines(*self.offsets[name]), single=True))
+        return records[0] if records else None
+
+
+class FoldersTxtWriter:
+    """folders.txt 写入器：追加模式下只在文件末尾添加新节，不重新解析已有内容"""
+
+    def __init__(self, path, header, append=False, encoding=None):
+        self.path = path
+        self.header = header
+        self.append = append
+        self.encoding = encoding or FOLDERS_ENCODING
+        self.count = 0
+        self._file = None
+
+    def __enter__(self):
+        has_content = self.append and os.path.exists(self.path) and os.path.getsize(self.path) > 0
+        ends_with_newline = True
+        if has_content:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                ends_with_newline = f.read(1) == b"\n"
+        with OwnRootWrite(self.path):
+            self._file = open(self.path, 'a' if self.append else 'w', encoding=self.encoding)
+        if not has_content:
+            self._file.write(self.header)
+        else:
+            self._file.write("\n" if ends_with_newline else "\n\n")
+        return self
+
+    def add(self, section, alias, icon):
+        self._file.write(f"[{section}]\n")
+        self._file.write(f"LocalizedResourceName={alias}\n")
+        self._file.write(f"IconResource={icon}\n\n")
+        self.count += 1
+
+    def __exit__(self, *exc):
+        self._file.close()
+
+
+FOLDERS_TXT_HEADER = (
+    "# 文件夹图标配置文件（存储相对路径）\n"
+    "# 格式：\n"
+    "# [文件夹名]\n"
+    "# LocalizedResourceName=显示名（别名，可修改）\n"
+    "# IconResource=EXE文件相对路径（相对于文件夹本身）\n\n"
+)
+
+
+# ------------------------------
+# SQLite 配置库（folders.txt 的可选替代）
+# ------------------------------
+class ConfigDb:
+    """SQLite 配置库：每个文件夹一行，以文件夹名为主键，查单个文件夹不必解析整个文件
+
+    除 folders.txt 中的别名和EXE相对路径外，还记录所选EXE的大小/mtime和扫描时间，
+    以及最后一次写入desktop.ini时的图标来源和内容哈希；可与 folders.txt 互相导入导出。
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS folders (
+            folder TEXT PRIMARY KEY COLLATE NOCASE,
+            position INTEGER NOT NULL DEFAULT 0,
+            alias TEXT,
+            exe TEXT NOT NULL DEFAULT '',
+            exe_size INTEGER,
+            exe_mtime_ns INTEGER,
+            scanned_at REAL,
+            icon TEXT,
+            applied_hash TEXT,
+            applied_at REAL
+        )
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # SQLite 每次写事务都会在同目录创建、删除回滚日志，打开期间的目录变化都算本工具的写入
+        self._own_write = OwnRootWrite(path).__enter__()
+        self.conn = sqlite3.connect(path)
+        with self.conn:
+            self.conn.execute(self.SCHEMA)
+
+    @classmethod
+    def open(cls, current_dir):
+        return cls(os.path.join(current_dir, CONFIG_DB_NAME))
+
+    def close(self):
+        self.conn.close()
+        self._own_write.__exit__(None, None, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def records(self):
+        """按配置顺序逐个产出 FolderRecord（line 为配置中的序号）"""
+        cursor = self.conn.execute("SELECT folder, alias, exe, position FROM folders ORDER BY position, folder")
+        for folder, alias, exe, position in cursor:
+            yield FolderRecord(folder, alias, exe, position)
+
+    def get(self, folder):
+        row = self.conn.execute(
+            "SELECT folder, alias, exe, position FROM folders WHERE folder = ?", (folder,)
+        ).fetchone()
+        return FolderRecord(*row) if row else None
+
+    def folders(self):
+        return [row[0] for row in self.conn.execute("SELECT folder FROM folders ORDER BY position, folder")]
+
+    def next_position(self):
+        return self.conn.execute("SELECT COALESCE(MAX(position), 0) + 1 FROM folders").fetchone()[0]
+
+    def put(self, current_dir, folder, alias, exe, position):
+        """新增或更新一个文件夹（不提交），同时记录所选EXE的大小和mtime"""
+        try:
+            st = os.stat(os.path.join(current_dir, folder, exe)) if exe else None
+        except OSError:
+            st = None
+        self.conn.execute(
+            """INSERT INTO folders (folder, position, alias, exe, exe_size, exe_mtime_ns, scanned_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(folder) DO UPDATE SET
+                   position = excluded.position, alias = excluded.alias, exe = excluded.exe,
+                   exe_size = excluded.exe_size, exe_mtime_ns = excluded.exe_mtime_ns,
+                   scanned_at = excluded.scanned_at""",
+            (folder, position, alias, exe,
+             st.st_size if st else None, st.st_mtime_ns if st else None, time.time())
+        )
+
+    def delete_except(self, folders):
+        """删除不在 folders 中的文件夹（不提交）"""
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep (folder TEXT PRIMARY KEY COLLATE NOCASE)")
+        self.conn.execute("DELETE FROM keep")
+        self.conn.executemany("INSERT OR IGNORE INTO keep VALUES (?)", ((f,) for f in folders))
+        deleted = self.conn.execute("DELETE FROM folders WHERE folder NOT IN (SELECT folder FROM keep)").rowcount
+        self.conn.execute("DELETE FROM keep")
+        return deleted
+
+    def record_plan(self, plan):
+        """在一个事务中记录本次执行结果：写入或未变化的记下图标来源和desktop.ini哈希"""
+        now = time.time()
+        with self.conn:
+            for item in plan:
+                if item.status in ("written", "unchanged"):
+                    self.conn.execute(
+                        "UPDATE folders SET icon = COALESCE(?, exe), applied_hash = ?, applied_at = ? WHERE folder = ?",
+                        (item.icon_path, hashlib.sha1(item.content).hexdigest(), now, item.folder)
+                    )
+                elif item.status == "deleted":
+                    self.conn.execute(
+                        "UPDATE folders SET icon = NULL, applied_hash = NULL, applied_at = ? WHERE folder = ?",
+                        (now, item.folder)
+                    )
+
+    def import_txt(self, current_dir, txt_path, encoding=None):
+        """用 folders.txt 整体替换配置（一个事务），返回（导入数, 删除数, 问题列表）"""
+        reader = FoldersTxtReader(txt_path, encoding)
+        names = []
+        with self.conn:
+            for position, record in enumerate(reader, 1):
+                self.put(current_dir, record.section, record.alias, record.icon, position)
+                names.append(record.section)
+            deleted = self.delete_except(names)
+        return len(names), deleted, reader.errors
+
+    def export_txt(self, txt_path, encoding=None):
+        """把配置导出为 folders.txt，返回导出数"""
+        with FoldersTxtWriter(txt_path, FOLDERS_TXT_HEADER, encoding=encoding) as writer:
+            for record in self.records():
+                writer.add(record.section, record.section if record.alias is None else record.alias, record.icon)
+        return writer.count
+
+
+class ConfigDbWriter:
+    """与 FoldersTxtWriter 接口相同的配置库写入器：整批在一个事务中提交，出错时整批回滚
+
+    replace=True 对应覆盖生成：本批未写入的文件夹在提交时删除（已写入的保留执行记录）。
+    """
+
+    def __init__(self, current_dir, replace=False):
+        self.current_dir = current_dir
+        self.replace = replace
+        self.count = 0
+        self.db = None
+        self._added = []
+        self._position = 0
+
+    def __enter__(self):
+        self.db = ConfigDb.open(self.current_dir)
+        self._position = 1 if self.replace else self.db.next_position()
+        return self
+
+    def add(self, section, alias, icon):
+        self.db.put(self.current_dir, section, alias, icon, self._position)
+        self._added.append(section)
+        self._position += 1
+        self.count += 1
+
+    def __exit__(self, exc_type, *exc):
+        try:
+            if exc_type is None:
+                if self.replace:
+                    self.db.delete_except(self._added)
+                self.db.conn.commit()
+            else:
+                self.db.conn.rollback()
+        finally:
+            self.db.close()
+
+
+class RootContext:
+    """一个操作目录的设置：folders.txt 编码、是否使用 SQLite 配置库
+
+    下面的配置函数和各库函数接收目录路径或 RootContext；传路径时沿用脚本顶部的全局设置。
+    同一进程处理多个目录时各自传入 RootContext，互不影响，也不修改全局设置。
+    """
+
+    def __init__(self, root, encoding=None, use_config_db=None):
+        self.root = os.path.abspath(root)
+        self.encoding = encoding or FOLDERS_ENCODING
+        self.use_config_db = USE_CONFIG_DB if use_config_db is None else use_config_db
+
+    @classmethod
+    def of(cls, root):
+        return root if isinstance(root, cls) else cls(root)
+
+
+def config_path(current_dir):
+    """当前使用的配置文件路径（folders.txt 或 SQLite 配置库）"""
+    ctx = RootContext.of(current_dir)
+    return os.path.join(ctx.root, CONFIG_DB_NAME if ctx.use_config_db else FOLDERS_TXT_NAME)
+
+
+def open_config_writer(current_dir, append=False):
+    """打开当前配置的写入器（覆盖或追加）"""
+    ctx = RootContext.of(current_dir)
+    if ctx.use_config_db:
+        return ConfigDbWriter(ctx.root, replace=not append)
+    return FoldersTxtWriter(config_path(ctx), FOLDERS_TXT_HEADER, append=append, encoding=ctx.encoding)
+
+
+def configured_folders(current_dir):
+    """当前配置中已有的文件夹名（folders.txt 只扫描标题行）"""
+    ctx = RootContext.of(current_dir)
+    if ctx.use_config_db:
+        with ConfigDb.open(ctx.root) as db:
+            return db.folders()
+    return FoldersTxtReader(config_path(ctx), ctx.encoding).sections()
+
+
+# ------------------------------
+# folders.txt 生成与更新功能
+# ------------------------------
+# 无交互时的EXE选择策略 → get_valid_exes 参数
+EXE_POLICIES = {
+    "best": {"limit": 1},                   # 按内嵌图标质量排序后的第一个
+    "first": {"limit": 1, "rank": False},   # 广度优先扫描到的第一个（层级最浅）
+    "single": {"limit": 2, "rank": False},  # 只有唯一候选时才选，有多个时跳过
+}
+
+
+def pick_exe(exes, policy="best"):
+    """按策略从候选EXE中选一个，返回（绝对路径, 相对路径）；不选时返回None"""
+    if not exes or (policy == "single" and len(exes) > 1):
+        return None
+    return exes[0]
+
+
+def choose_exe_interactive(folder, exes):
+    """交互选择EXE：只有一个时直接使用，多个时输入序号，返回相对路径（0=跳过时为None）"""
+    if len(exes) == 1:
+        abs_path, rel_path = exes[0]
+        print(f"   找到1个有效EXE（相对路径）：{rel_path}")
+        print(f"   对应绝对路径：{abs_path}")
+        return rel_path
+    print(f"   找到{len(exes)}个有效EXE，请选择：")
+    for j, (abs_path, rel_path) in enumerate(exes, 1):
+        print(f"   {j}. 相对路径：{rel_path}")
+        print(f"      绝对路径：{abs_path}")
+    while True:
+        try:
+            choice = input(f"   请输入序号（1-{len(exes)}，0=跳过）：").strip()
+            num = int(choice)
+            if num == 0:
+                return None
+            if 1 <= num <= len(exes):
+                selected_rel = exes[num-1][1]
+                print(f"   已选择相对路径：{selected_rel}")
+                return selected_rel
+            print(f"   请输入1到{len(exes)}之间的数字")
+        except ValueError:
+            print("   请输入有效数字")
+
+
+def scan_root(root, policy="best", list_all=False):
+    """只读扫描 root 下各文件夹，逐个产出（文件夹, 候选相对路径列表, 选中的相对路径或None, 错误）
+
+    list_all=False 时只扫描到策略需要的候选数为止；
+    已有的扫描索引会被复用，但不写回（不在操作目录中写入任何文件）。
+    """
+    ctx = RootContext.of(root)
+    folders = get_folder_snapshot(ctx.root).names()
+    scan_kwargs = dict(EXE_POLICIES[policy])
+    if list_all:
+        scan_kwargs.pop("limit")
+    rules = load_scan_rules(ctx.root, ctx.encoding)
+    index = ScanIndex.load(ctx.root, rules)
+    for folder, exes, error, _ in scan_folders_parallel(ctx.root, folders, index=index, rules=rules, **scan_kwargs):
+        picked = pick_exe(exes, policy)
+        yield folder, [rel_path for _, rel_path in exes], picked[1] if picked else None, error
+
+
+def write_config(root, policy="best", update=False, chooser=None):
+    """扫描 root 下各文件夹的EXE并写入配置（folders.txt 或配置库），返回（写入数, 处理的文件夹数）
+
+    chooser 为 None 时按 policy 并行扫描、自动选择；否则逐个调用 chooser(文件夹, 候选列表)
+    选择（返回相对路径或None），同时后台预扫描后面的文件夹。
+    update=True 时只追加配置中还没有的文件夹，否则覆盖整个配置。
+    """
+    ctx = RootContext.of(root)
+    root = ctx.root
+    txt_path = config_path(ctx)
+    all_folders = get_folder_snapshot(root).names()
+    folders = all_folders
+    if update and os.path.exists(txt_path):
+        try:
+            # 只需文件夹名：folders.txt 只扫描标题行，不解析各节内容
+            existing_folders = set(configured_folders(ctx))
+            print(f"ℹ️  检测到现有配置，包含 {len(existing_folders)} 个文件夹")
+            folders = [f for f in all_folders if f not in existing_folders]
+        except Exception as e:
+            print(f"⚠️  读取现有配置失败：{str(e)}，将创建新文件")
+            update = False
+    if not folders:
+        print("ℹ️  没有检测到新文件夹，无需更新" if update else "ℹ️  没有找到可处理的文件夹")
+        return 0, 0
+
+    backup_folders_txt(current_dir=ctx)
+    rules = load_scan_rules(root, ctx.encoding)
+    index = ScanIndex.load(root, rules)
+    total = len(folders)
+    with open_config_writer(ctx, append=update) as writer:
+        if chooser is None:
+            serial_time = 0.0
+            start = time.perf_counter()
+            # 并行扫描，按文件夹原顺序写入，保证输出稳定
+            results = scan_folders_parallel(root, folders, workers=SCAN_WORKERS, index=index, rules=rules,
+                                            **EXE_POLICIES[policy])
+            for folder, exes, error, duration in results:
+                serial_time += duration
+                picked = pick_exe(exes, policy)
+                if error:
+                    print(f"❌ 跳过：{folder}（扫描出错：{str(error)}）")
+                elif picked:
+                    writer.add(folder, folder, picked[1])
+                    print(f"✅ 处理：{folder}（相对路径：{picked[1]}）")
+                elif exes:
+                    print(f"⚠️  跳过：{folder}（有多个候选EXE，策略 {policy} 不自动选择）")
+                else:
+                    print(f"⚠️  跳过：{folder}（无有效EXE）")
+            elapsed = time.perf_counter() - start
+            print(f"\n⏱️  扫描耗时 {elapsed:.2f} 秒（线程数 {SCAN_WORKERS}）")
+            # 各文件夹耗时是在并发下测得的（含线程间争用），两者之比只是估计，耗时太短时没有意义
+            if SCAN_WORKERS > 1 and elapsed >= MIN_TIMING_SECONDS:
+                print(f"   各文件夹耗时合计 {serial_time:.2f} 秒，估计并行约为串行的 {serial_time / elapsed:.1f} 倍速度"
+                      f"（仅供参考，准确对比请把 SCAN_WORKERS 设为 1 再运行一次）")
+        else:
+            with ExePrefetcher(root, folders, index=index, rules=rules) as prefetcher:
+                for i, folder in enumerate(folders, 1):
+                    print(f"\n[{i}/{total}] 处理{'新' if update else ''}文件夹：{folder}")
+                    exes = prefetcher.get(i - 1)
+                    if not exes:
+                        print(f"   ⚠️  未找到有效EXE，跳过")
+                        continue
+                    selected_rel = chooser(folder, exes)
+                    if selected_rel:
+                        writer.add(folder, folder, selected_rel)
+                        print(f"   ✅ 已添加到配置")
+
+    print(f"\n📊 处理结果：成功 {writer.count}/{total} 个文件夹")
+    index.prune(all_folders)
+    index.save()
+    print(f"ℹ️  {index.summary()}")
+    PLACEHOLDERS.report(root)
+    print(f"✅ 成功{'更新' if update else '生成'} {txt_path}" + ("" if ctx.use_config_db else f"（编码：{ctx.encoding}）"))
+    return writer.count, total
+
+
+def confirm_overwrite_config(root):
+    """配置已存在时询问是否覆盖"""
+    txt_path = config_path(root)
+    if os.path.exists(txt_path):
+        confirm = input(f"⚠️  即将覆盖现有 {os.path.basename(txt_path)}，是否继续？(y/n)：").strip().lower()
+        if confirm != 'y':
+            print("ℹ️  已取消生成")
+            return False
+    return True
+
+
+def generate_folders_txt_interactive():
+    """交互生成folders.txt（存储相对路径）"""
+    try:
+        print("\n" + "-" * 40)
+        print("          交互生成 folders.txt（相对路径版）          ")
+        print("-" * 40)
+        if confirm_overwrite_config(OPERATE_DIR):
+            write_config(OPERATE_DIR, chooser=choose_exe_interactive)
+    except Exception as e:
+        print(f"❌ 生成失败：{str(e)}")
+    finally:
+        wait_for_space()
+
+
+def generate_folders_txt_auto():
+    """自动生成folders.txt（存储相对路径）"""
+    try:
+        print("\n" + "-" * 40)
+        print("          自动生成 folders.txt（相对路径版）          ")
+        print("-" * 40)
+        if confirm_overwrite_config(OPERATE_DIR):
+            write_config(OPERATE_DIR)
+    except Exception as e:
+        print(f"❌ 生成失败：{str(e)}")
+    finally:
+        wait_for_space()
+
+
+def update_folders_txt_interactive():
+    """交互更新folders.txt（仅添加新文件夹）"""
+    try:
+        print("\n" + "-" * 40)
+        print("          交互更新 folders.txt（相对路径版）          ")
+        print("-" * 40)
+        write_config(OPERATE_DIR, update=True, chooser=choose_exe_interactive)
+    except Exception as e:
+        print(f"❌ 更新失败：{str(e)}")
+    finally:
+        wait_for_space()
+
+
+# ------------------------------
+# desktop.ini 生成与清理功能
+# ------------------------------
+def build_desktop_ini_content(display_name, icon_path):
+    """生成desktop.ini的完整内容（字节）"""
+    text = (
+        "[.ShellClassInfo]\r\n"
+        f"LocalizedResourceName={display_name}\r\n"
+        f"IconResource={icon_path},0\r\n"
+    )
+    return text.encode(DESKTOP_INI_ENCODING)
+
+
+def file_digest(path):
+    """计算文件内容的SHA1"""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def file_content_unchanged(path, content):
+    """磁盘上的文件是否已与预期内容一致（先比大小，再比哈希）"""
+    try:
+        if os.stat(path).st_size != len(content):
+            return False
+        return file_digest(path) == hashlib.sha1(content).hexdigest()
+    except OSError:
+        return False
+
+
+def replace_hidden_file(path, content):
+    """同目录写临时文件后一次重命名替换文件，并设为隐藏+系统
+
+    重命名是原子的：中途崩溃最多留下临时文件，目标文件始终是完整的旧版或新版。
+    """
+    temp_path = path + DESKTOP_INI_TEMP_SUFFIX
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        # 只读/系统属性会导致替换失败，先去掉
+        if os.path.exists(path):
+            ensure_file_writable(path)
+        os.replace(temp_path, path)
+    except Exception:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    win32api.SetFileAttributes(
+        path,
+        win32con.FILE_ATTRIBUTE_HIDDEN | win32con.FILE_ATTRIBUTE_SYSTEM
+    )
+
+
+def replace_desktop_ini(ini_path, content):
+    """原子替换desktop.ini，文件夹任何时刻都保有完整的desktop.ini"""
+    replace_hidden_file(ini_path, content)
+
+
+def remove_extracted_icon(folder_path):
+    """删除旧版提取到文件夹内的图标文件（不存在时忽略）"""
+    icon_path = os.path.join(folder_path, ICON_FILE_NAME)
+    if os.path.exists(icon_path) and ensure_file_writable(icon_path):
+        os.remove(icon_path)
+
+
+def desktop_ini_attributes_ok(ini_path):
+    """desktop.ini是否已带隐藏+系统属性"""
+    wanted = win32con.FILE_ATTRIBUTE_HIDDEN | win32con.FILE_ATTRIBUTE_SYSTEM
+    return win32api.GetFileAttributes(ini_path) & wanted == wanted
+
+
+# ------------------------------
+# 共享图标库（按图标内容哈希去重）
+# ------------------------------
+_ICON_NAME = re.compile(r"^[0-9a-f]{40}\.ico$")
+
+
+class IconStore:
+    """操作目录下的共享图标库：图标文件以内容SHA1命名，相同图标只存一份
+
+    索引按EXE路径记录（大小, mtime_ns, 图标哈希），EXE未变化且图标已在库中时
+    直接复用，不再打开EXE提取；没有图标的EXE也会记录，避免反复尝试。
+    """
+    VERSION = 1
+
+    def __init__(self, current_dir):
+        self.current_dir = current_dir
+        self.dir = os.path.join(current_dir, ICON_STORE_NAME)
+        self.index_path = os.path.join(self.dir, "index.json")
+        self.sources = {}  # 相对操作目录的EXE路径 -> [大小, mtime_ns, 图标哈希或None]
+        self.extracted = 0
+        self.reused = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, current_dir):
+        store = cls(current_dir)
+        data = load_json(store.index_path, {})
+        if data.get("version") == cls.VERSION:
+            store.sources = data.get("sources", {})
+        return store
+
+    def _key(self, exe_path):
+        return os.path.relpath(exe_path, self.current_dir).replace(os.sep, "/")
+
+    def icon_path(self, digest):
+        return os.path.join(self.dir, digest + ".ico")
+
+    def owns(self, icon_path):
+        """图标路径是否指向本图标库"""
+        return (os.path.normcase(os.path.dirname(os.path.abspath(icon_path)))
+                == os.path.normcase(os.path.abspath(self.dir)))
+
+    def resolve(self, exe_path):
+        """返回（库中图标路径, 需要写入的图标内容）；EXE没有图标时为（None, None），
+        图标已在库中时内容为None"""
+        st = os.stat(exe_path)
+        key = self._key(exe_path)
+        with self._lock:
+            record = self.sources.get(key)
+        if record and record[0] == st.st_size and record[1] == st.st_mtime_ns:
+            if record[2] is None:
+                self.reused += 1
+                return None, None
+            if os.path.exists(self.icon_path(record[2])):
+                self.reused += 1
+                return self.icon_path(record[2]), None
+        if PLACEHOLDERS.is_placeholder(exe_path):
+            return None, None
+
+        data = extract_icon_group(exe_path)
+        digest = hashlib.sha1(data).hexdigest() if data else None
+        with self._lock:
+            self.sources[key] = [st.st_size, st.st_mtime_ns, digest]
+            self.extracted += 1
+        if digest is None:
+            return None, None
+        icon_path = self.icon_path(digest)
+        return icon_path, (None if os.path.exists(icon_path) else data)
+
+    def write(self, icon_path, data):
+        """把图标写入库中（已存在时跳过；多个文件夹可能同时写同一个图标）"""
+        with self._lock:
+            if os.path.exists(icon_path):
+                return
+            if not os.path.isdir(self.dir):
+                with OwnRootWrite(self.dir):
+                    os.makedirs(self.dir)
+                win32api.SetFileAttributes(self.dir, win32con.FILE_ATTRIBUTE_HIDDEN)
+            replace_hidden_file(icon_path, data)
+
+    def referenced(self, snapshot):
+        """各顶层文件夹的desktop.ini当前引用的库中图标文件名；有desktop.ini读取失败时返回None（无法判断）"""
+        names = set()
+        for name in snapshot.names():
+            if not snapshot.has_desktop_ini(name):
+                continue
+            ini_path = os.path.join(snapshot.get(name).path, "desktop.ini")
+            try:
+                icon_source = read_desktop_ini_icon(ini_path)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                print(f"⚠️  无法读取 {ini_path}：{str(e)}，本次不清除图标库")
+                return None
+            if icon_source and self.owns(icon_source):
+                names.add(os.path.normcase(os.path.basename(icon_source)))
+        return names
+
+    def collect_garbage(self, snapshot):
+        """删除已没有任何desktop.ini引用的图标，返回删除数量（无法确定引用关系时不删除）"""
+        if not os.path.isdir(self.dir):
+            return 0
+        keep = self.referenced(snapshot)
+        if keep is None:
+            return 0
+        removed = set()
+        with os.scandir(self.dir) as it:
+            for entry in it:
+                name = os.path.normcase(entry.name)
+                if not _ICON_NAME.match(name) or name in keep:
+                    continue
+                try:
+                    if ensure_file_writable(entry.path):
+                        os.remove(entry.path)
+                        removed.add(name[:-len(".ico")])
+                except OSError as e:
+                    print(f"⚠️  无法删除图标 {entry.name}：{str(e)}")
+        with self._lock:
+            for key in [k for k, record in self.sources.items() if record[2] in removed]:
+                del self.sources[key]
+        return len(removed)
+
+    def save(self):
+        if not os.path.isdir(self.dir):
+            return
+        try:
+            with self._lock:
+                save_json_atomic(self.index_path, {"version": self.VERSION, "sources": self.sources})
+        except Exception as e:
+            print(f"⚠️  保存图标库索引失败：{str(e)}")
+
+    def summary(self):
+        return f"图标库：复用 {self.reused} 个，重新提取 {self.extracted} 个"
+
+
+# ------------------------------
+# desktop.ini 清单（记录本工具写入的文件）
+# ------------------------------
+class DesktopIniManifest:
+    """记录本工具写入的desktop.ini及其内容哈希，清理时只处理这些文件"""
+    VERSION = 1
+
+    def __init__(self, current_dir):
+        self.current_dir = current_dir
+        self.path = os.path.join(current_dir, MANIFEST_NAME)
+        self.entries = {}  # 文件夹相对路径 -> desktop.ini 的 SHA1
+        self.pending = set()  # desktop.ini 已变化、尚未刷新的文件夹
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, current_dir):
+        manifest = cls(current_dir)
+        data = load_json(manifest.path, {})
+        if data.get("version") == cls.VERSION:
+            manifest.entries = data.get("entries", {})
+            manifest.pending = set(data.get("pending", []))
+        return manifest
+
+    @staticmethod
+    def _key(folder):
+        return folder.replace(os.sep, "/")
+
+    def ini_path(self, key):
+        return os.path.join(self.current_dir, *key.split("/"), "desktop.ini")
+
+    def record(self, folder, content):
+        with self._lock:
+            self.entries[self._key(folder)] = hashlib.sha1(content).hexdigest()
+
+    def forget(self, folder):
+        with self._lock:
+            self.entries.pop(self._key(folder), None)
+
+    def owns(self, folder):
+        return self._key(folder) in self.entries
+
+    def unmodified(self, folder):
+        """desktop.ini 由本工具写入且之后未被修改（内容哈希与清单一致）"""
+        digest = self.entries.get(self._key(folder))
+        if digest is None:
+            return False
+        try:
+            return file_digest(self.ini_path(self._key(folder))) == digest
+        except OSError:
+            return False
+
+    def mark_pending(self, folders):
+        """记录desktop.ini实际发生变化的文件夹，刷新时只处理这些文件夹"""
+        with self._lock:
+            self.pending.update(self._key(folder) for folder in folders)
+
+    def clear_pending(self, folders):
+        with self._lock:
+            self.pending.difference_update(self._key(folder) for folder in folders)
+
+    def save(self):
+        try:
+            with self._lock:
+                save_json_atomic(self.path, {
+                    "version": self.VERSION,
+                    "entries": self.entries,
+                    "pending": sorted(self.pending),
+                })
+        except Exception as e:
+            print(f"⚠️  保存desktop.ini清单失败：{str(e)}")
+
+
+def find_orphan_desktop_ini(current_dir, manifest, max_depth=CLEAN_ORPHAN_DEPTH, encoding=None):
+    """有限深度扫描未登记在清单中的desktop.ini（遵循剪枝规则，encoding 为规则文件编码）"""
+    rules = load_scan_rules(current_dir, encoding)
+    orphans = []
+    queue = collections.deque([(current_dir, "", 0)])
+    while queue:
+        dir_path, rel_dir, depth = queue.popleft()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
             try:
-                display_name = config.get(folder_name, 'LocalizedResourceName', fallback=folder_name).strip()
-                icon_rel_path = config.get(folder_name, 'IconResource', fallback='').strip()
-                print(f"   显示名：{display_name}")
-                print(f"   配置的相对路径：{icon_rel_path}")
-            except Exception as e:
-                print(f"   ⚠️  跳过：配置项错误 - {str(e)}")
-                continue
-            
-            if not icon_rel_path or not icon_rel_path.lower().endswith('.exe'):
-                print(f"   ⚠️  跳过：IconResource无效（非EXE文件）")
+                if entry.is_dir(follow_symlinks=False):
+                    if (depth < max_depth and not entry.name.startswith('.')
+                            and not rules.skip_dir(entry.name, rel_path)):
+                        queue.append((entry.path, rel_path, depth + 1))
+                elif entry.name.lower() == "desktop.ini" and not manifest.owns(rel_dir):
+                    orphans.append(entry.path)
+            except OSError:
                 continue
-            
-            final_icon_path = os.path.normpath(os.path.join(folder_abs_path, icon_rel_path))
-            print(f"   拼接后的绝对路径：{final_icon_path}")
-            
-            if not os.path.exists(final_icon_path) or not os.path.isfile(final_icon_path):
-                print(f"   ⚠️  跳过：EXE文件不存在或不是有效文件")
+    return orphans
+
+
+# ------------------------------
+# 断点续跑日志与中断恢复
+# ------------------------------
+JOURNAL_LABELS = {"generate": "批量生成 desktop.ini", "move": "批量移动 desktop.ini", "refresh": "刷新图标缓存"}
+
+
+_RUN_NUMBERS = itertools.count(1)  # 同一进程内的运行序号（同一秒内开始的多次运行编号也不同）
+
+
+class RunJournal:
+    """追加写入的断点续跑日志：每完成一个文件夹的一步追加一行 JSON，正常结束时记录结束
+
+    同一操作上次没有正常结束、且输入未变（签名相同）时，可跳过已完成的文件夹继续；
+    续跑沿用原来的运行编号，再次中断也不会丢失之前的进度。
+    每行写入后立即 flush，Ctrl-C 或程序崩溃最多丢失正在处理的那一个文件夹。
+    """
+    FSYNC_EVERY = 100
+
+    def __init__(self, current_dir, operation, signature=""):
+        self.path = os.path.join(current_dir, JOURNAL_NAME)
+        self.operation = operation
+        self.signature = signature
+        self.run_id = None
+        self._file = None
+        self._steps = 0
+
+    @staticmethod
+    def _read_runs(path):
+        """返回 {运行编号: {"op", "sig", "done", "finished"}}（按开始顺序）"""
+        runs = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # 中断时写了一半的行
+                    run = runs.get(record.get("run"))
+                    if record.get("event") == "start":
+                        if run is None:
+                            runs[record["run"]] = run = {"op": record.get("op"), "done": {}, "finished": False}
+                        run["sig"] = record.get("sig")
+                    elif run is not None and record.get("event") == "step":
+                        run["done"][record["folder"]] = record.get("status")
+                    elif run is not None and record.get("event") == "end":
+                        run["finished"] = True
+        except OSError:
+            pass
+        return runs
+
+    @classmethod
+    def unfinished(cls, current_dir):
+        """各操作最近一次未正常结束的运行 {操作: 运行记录}"""
+        latest = {}
+        for run in cls._read_runs(os.path.join(current_dir, JOURNAL_NAME)).values():
+            latest[run["op"]] = run
+        return {op: run for op, run in latest.items() if not run["finished"]}
+
+    def _append(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def start(self, resume=True):
+        """开始运行，返回已完成的 {文件夹: 状态}
+
+        上次同一操作中断且输入未变时：resume 为 True/False 直接续跑/从头开始；
+        也可传入 fn(操作名, 已完成数)（如菜单中的 confirm_resume）询问后决定。
+        """
+        done = {}
+        runs = self._read_runs(self.path)
+        previous = [(run_id, run) for run_id, run in runs.items() if run["op"] == self.operation]
+        stale = previous[-1][0] if previous and not previous[-1][1]["finished"] else None
+        if stale is not None and previous[-1][1]["done"]:
+            run_id, run = previous[-1]
+            label = JOURNAL_LABELS.get(self.operation, self.operation)
+            if run["sig"] != self.signature:
+                print(f"ℹ️  上次“{label}”未完成，但输入已变化，将从头开始")
+            else:
+                if decide(resume, label, len(run["done"])):
+                    self.run_id = run_id
+                    done = dict(run["done"])
+        if self.run_id is None:
+            self.run_id = f"{datetime.datetime.now():%Y%m%d%H%M%S}-{os.getpid()}-{next(_RUN_NUMBERS)}"
+        with OwnRootWrite(self.path):
+            self._file = open(self.path, 'a', encoding='utf-8')
+        if stale is not None and stale != self.run_id:
+            # 不续跑的旧运行记为放弃，否则它会一直被当作“未完成”
+            self._append({"run": stale, "event": "end", "abandoned": True})
+        self._append({"run": self.run_id, "event": "start", "op": self.operation, "sig": self.signature})
+        return done
+
+    def step(self, folder, status="done"):
+        """记录一个文件夹的一步已完成"""
+        self._append({"run": self.run_id, "event": "step", "folder": folder, "status": status})
+        self._steps += 1
+        if self._steps % self.FSYNC_EVERY == 0:
+            os.fsync(self._file.fileno())
+
+    def finish(self):
+        """记录正常结束，并压缩日志（只保留其他操作未完成的运行）"""
+        self._append({"run": self.run_id, "event": "end"})
+        self._file.close()
+        self._file = None
+        keep = {run_id for run_id, run in self._read_runs(self.path).items()
+                if not run["finished"] and run["op"] != self.operation}
+        try:
+            with OwnRootWrite(self.path):
+                if not keep:
+                    os.remove(self.path)
+                    return
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    lines = [line for line in f if any(f'"run": "{run_id}"' in line for run_id in keep)]
+                temp_path = self.path + ".tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.writelines(lines)
+                os.replace(temp_path, self.path)
+        except OSError:
+            pass
+
+    def close(self):
+        """未正常结束时只关闭文件（保留进度供下次续跑）"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def confirm_resume(label, done_count):
+    """菜单中询问是否从上次中断处继续"""
+    confirm = input(f"⚠️  上次“{label}”中断前已完成 {done_count} 个文件夹，是否从中断处继续？(y/n)：")
+    return confirm.strip().lower() == 'y'
+
+
+def signature_of(values):
+    """一组输入的签名，用于判断续跑时输入是否变化"""
+    digest = hashlib.sha1()
+    for value in values:
+        digest.update(repr(value).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _complete_desktop_ini(path):
+    """临时文件是否是完整写入的desktop.ini（写入顺序：标题行……图标行结尾）"""
+    try:
+        with open(path, 'rb') as f:
+            content = f.read()
+    except OSError:
+        return False
+    return content.startswith(b"[.ShellClassInfo]") and content.endswith(b",0\r\n")
+
+
+def _recover_legacy_move_dir(current_dir, snapshot):
+    """旧版“移动刷新”中断时留在 .temp_ini_move 的desktop.ini：按图标路径找回原文件夹并移回"""
+    temp_dir = os.path.join(current_dir, ".temp_ini_move")
+    if not os.path.isdir(temp_dir):
+        return 0, 0
+    recovered = 0
+    for name in os.listdir(temp_dir):
+        temp_path = os.path.join(temp_dir, name)
+        try:
+            icon_source = os.path.normcase(read_desktop_ini_icon(temp_path) or "")
+        except OSError:
+            continue
+        targets = [
+            entry for entry in snapshot.folders
+            if icon_source.startswith(os.path.normcase(entry.path) + os.sep)
+            and not os.path.exists(os.path.join(entry.path, "desktop.ini"))
+        ]
+        if len(targets) != 1:
+            print(f"⚠️  无法确定 {temp_path} 原属的文件夹，请手动处理")
+            continue
+        ini_path = os.path.join(targets[0].path, "desktop.ini")
+        os.replace(temp_path, ini_path)
+        win32api.SetFileAttributes(ini_path, win32con.FILE_ATTRIBUTE_HIDDEN | win32con.FILE_ATTRIBUTE_SYSTEM)
+        snapshot.set_desktop_ini(targets[0].name, True)
+        print(f"✅ 已移回：{ini_path}")
+        recovered += 1
+    remaining = len(os.listdir(temp_dir))
+    if remaining == 0:
+        os.rmdir(temp_dir)
+    return recovered, remaining
+
+
+def recover_interrupted_files(current_dir):
+    """启动时恢复或清理上次中断留下的临时文件"""
+    recovered = removed = 0
+    snapshot = get_folder_snapshot(current_dir)
+    
+    # 1. 旧版 .temp_ini_move 中滞留的desktop.ini
+    moved_back, remaining = _recover_legacy_move_dir(current_dir, snapshot)
+    recovered += moved_back
+    
+    # 2. 生成/移动中断时各文件夹内的临时文件：原文件还在则丢弃，缺失且临时文件完整则补上
+    if {"generate", "move"} & set(RunJournal.unfinished(current_dir)):
+        for entry in snapshot.folders:
+            ini_path = os.path.join(entry.path, "desktop.ini")
+            temp_path = ini_path + DESKTOP_INI_TEMP_SUFFIX
+            if not os.path.exists(temp_path):
                 continue
-            
-            ini_path = os.path.join(folder_abs_path, "desktop.ini")
-            if ensure_file_writable(ini_path):
-                try:
-                    with open(ini_path, 'w', encoding='ANSI', newline='\r\n') as f:
-                        f.write("[.ShellClassInfo]\r\n")
-                        f.write(f"LocalizedResourceName={display_name}\r\n")
-                        f.write(f"IconResource={final_icon_path},0\r\n")
-                    
+            try:
+                if not os.path.exists(ini_path) and _complete_desktop_ini(temp_path):
+                    os.replace(temp_path, ini_path)
                     win32api.SetFileAttributes(
-                        ini_path,
-                        win32con.FILE_ATTRIBUTE_HIDDEN | win32con.FILE_ATTRIBUTE_SYSTEM
+                        ini_path, win32con.FILE_ATTRIBUTE_HIDDEN | win32con.FILE_ATTRIBUTE_SYSTEM
                     )
-                    print(f"   ✅ 成功生成desktop.ini")
-                    processed += 1
-                except Exception as e:
-                    print(f"   ❌ 生成失败：{str(e)}")
+                    snapshot.set_desktop_ini(entry.name, True)
+                    recovered += 1
+                else:
+                    ensure_file_writable(temp_path)
+                    os.remove(temp_path)
+                    removed += 1
+            except OSError as e:
+                print(f"⚠️  无法处理临时文件 {temp_path}：{str(e)}")
+    
+    # 3. 图标库、备份库和操作目录下写了一半的文件
+    for directory, suffix in ((os.path.join(current_dir, ICON_STORE_NAME), DESKTOP_INI_TEMP_SUFFIX),
+                              (os.path.join(current_dir, BACKUP_DIR_NAME), ".tmp")):
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.endswith(suffix):
+                    os.remove(os.path.join(directory, name))
+                    removed += 1
+    for name in (SCAN_INDEX_NAME + ".tmp", MANIFEST_NAME + ".tmp", JOURNAL_NAME + ".tmp",
+                 FOLDERS_TXT_NAME + ".restore.tmp", CONFIG_DB_NAME + ".restore.tmp"):
+        path = os.path.join(current_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+            removed += 1
+    
+    if recovered or removed:
+        print(f"ℹ️  已处理上次中断留下的临时文件：恢复 {recovered} 个，清理 {removed} 个")
+    for op in RunJournal.unfinished(current_dir):
+        print(f"ℹ️  上次“{JOURNAL_LABELS.get(op, op)}”未完成，再次执行时可从中断处继续")
+
+
+# ------------------------------
+# 变更计划（folders.txt → desktop.ini）
+# ------------------------------
+PLAN_LABELS = {
+    "create": "新建",
+    "update": "更新",
+    "delete": "删除",
+    "noop": "不变",
+    "skip": "跳过",
+    "error": "出错",
+    "unmanaged": "非本工具管理（保留）",
+}
+
+
+class PlanItem:
+    """变更计划中的一项：某个文件夹的desktop.ini要执行的操作"""
+    __slots__ = ("folder", "action", "ini_path", "content", "icon_path", "icon_data", "lines", "status")
+
+    def __init__(self, folder, action, ini_path=None, content=None, lines=None):
+        self.folder = folder
+        self.action = action
+        self.ini_path = ini_path
+        self.content = content
+        self.icon_path = None  # 需要写入的图标文件（None=直接引用EXE）
+        self.icon_data = None
+        self.lines = lines or []
+        self.status = None  # 执行后的结果（written/unchanged/deleted/skipped/failed）
+
+
+def read_folders_config(txt_path, encoding=None):
+    """读取folders.txt为 FolderRecord 列表，文件无法读取时打印原因并返回None
+
+    有问题的节只跳过该节并提示行号，不影响其余文件夹。
+    """
+    if not os.path.exists(txt_path):
+        print(f"❌ 错误：未找到配置文件 {txt_path}")
+        return None
+    reader = FoldersTxtReader(txt_path, encoding)
+    try:
+        records = list(reader)
+    except Exception as e:
+        print(f"❌ 读取配置失败：{str(e)}")
+        return None
+    print(f"✅ 成功读取配置（编码：{reader.encoding}）：{txt_path}")
+    if reader.errors:
+        print(f"⚠️  配置中有 {len(reader.errors)} 处问题（相关的节已跳过或忽略该行）：")
+        for line_no, message in reader.errors[:10]:
+            print(f"   第 {line_no} 行：{message}")
+        if len(reader.errors) > 10:
+            print(f"   ……其余 {len(reader.errors) - 10} 处省略")
+        if any("解码" in message for _, message in reader.errors):
+            print(f"   请将 {FOLDERS_TXT_NAME} 保存为 {reader.encoding} 格式")
+    return records
+
+
+def load_folder_records(current_dir):
+    """读取当前配置（folders.txt 或 SQLite 配置库）为 FolderRecord 列表，失败时返回None"""
+    ctx = RootContext.of(current_dir)
+    if not ctx.use_config_db:
+        return read_folders_config(config_path(ctx), ctx.encoding)
+    db_path = config_path(ctx)
+    if not os.path.exists(db_path):
+        print(f"❌ 错误：未找到配置库 {db_path}（可用菜单D从 {FOLDERS_TXT_NAME} 导入）")
+        return None
+    try:
+        with ConfigDb(db_path) as db:
+            records = list(db.records())
+    except sqlite3.Error as e:
+        print(f"❌ 读取配置库失败：{str(e)}")
+        return None
+    print(f"✅ 成功读取配置库：{db_path}")
+    return records
+
+
+def plan_folder_desktop_ini(current_dir, snapshot, record, store=None):
+    """对比配置与磁盘现状，得出单个文件夹的计划项（只读，不修改任何文件）"""
+    folder_name = record.section
+    item = PlanItem(folder_name, "skip")
+    lines = item.lines
+    lines += [f"\n{'-'*40}", f"📂 正在处理文件夹：[{folder_name}]"]
+    try:
+        folder_path = os.path.join(current_dir, folder_name)
+        folder_abs_path = os.path.abspath(folder_path)
+        lines.append(f"   文件夹绝对路径：{folder_abs_path}")
+        if snapshot.get(folder_name) is None and not os.path.isdir(folder_abs_path):
+            lines.append(f"   ⚠️  跳过：文件夹不存在")
+            return item
         
-        print(f"\n{'-'*60}")
-        print(f"📊 处理结果：成功 {processed}/{total} 个文件夹")
-        print(f"⚠️  提示：请等待直到手动刷新后显示别名")
+        display_name = folder_name if record.alias is None else record.alias
+        icon_rel_path = record.icon
+        lines.append(f"   显示名：{display_name}")
+        lines.append(f"   配置的相对路径：{icon_rel_path}")
+        
+        if not icon_rel_path or not icon_rel_path.lower().endswith('.exe'):
+            lines.append(f"   ⚠️  跳过：IconResource无效（非EXE文件）")
+            return item
+        
+        final_icon_path = os.path.normpath(os.path.join(folder_abs_path, icon_rel_path))
+        lines.append(f"   拼接后的绝对路径：{final_icon_path}")
+        
+        if not os.path.isfile(final_icon_path):
+            lines.append(f"   ⚠️  跳过：EXE文件不存在或不是有效文件")
+            return item
+        
+        # 图标提取到共享图标库，资源管理器显示时就不必打开（可能很大的）EXE
+        icon_source = final_icon_path
+        if store is not None:
+            try:
+                item.icon_path, item.icon_data = store.resolve(final_icon_path)
+            except (OSError, ValueError, struct.error, IndexError):
+                item.icon_path = None
+            if item.icon_path:
+                icon_source = item.icon_path
+                lines.append(f"   图标文件：{item.icon_path}")
+            else:
+                lines.append(f"   ℹ️  未能提取图标（或为云同步占位文件），直接引用EXE")
+        
+        item.ini_path = os.path.join(folder_abs_path, "desktop.ini")
+        item.content = build_desktop_ini_content(display_name, icon_source)
+        icon_ok = item.icon_data is None and not os.path.exists(os.path.join(folder_abs_path, ICON_FILE_NAME))
+        if not os.path.exists(item.ini_path):
+            item.action = "create"
+        elif (icon_ok and file_content_unchanged(item.ini_path, item.content)
+                and desktop_ini_attributes_ok(item.ini_path)):
+            # 内容和属性都一致时不重写，避免资源管理器无谓地重建图标
+            item.action = "noop"
+        else:
+            item.action = "update"
+        snapshot.set_desktop_ini(folder_name, item.action != "create")
+    except Exception as e:
+        item.action = "error"
+        lines.append(f"   ❌ 生成失败：{str(e)}")
+    return item
+
+
+def plan_orphan_desktop_ini(snapshot, folder_name, manifest=None):
+    """不在配置中的文件夹：desktop.ini 由本工具写入且未被修改时才计划删除，其余只列出不处理"""
+    if not snapshot.has_desktop_ini(folder_name):
+        return None
+    entry = snapshot.get(folder_name)
+    ini_path = os.path.join(entry.path, "desktop.ini")
+    if manifest is None or not manifest.unmodified(folder_name):
+        reason = "已被手动修改" if manifest is not None and manifest.owns(folder_name) else "不是本工具生成的"
+        return PlanItem(folder_name, "unmanaged", ini_path=ini_path, lines=[
+            f"\n{'-'*40}",
+            f"📂 正在处理文件夹：[{folder_name}]",
+            f"   ⏭️  不在 {FOLDERS_TXT_NAME} 中，desktop.ini {reason}，保留：{ini_path}",
+        ])
+    return PlanItem(folder_name, "delete", ini_path=ini_path, lines=[
+        f"\n{'-'*40}",
+        f"📂 正在处理文件夹：[{folder_name}]",
+        f"   不在 {FOLDERS_TXT_NAME} 中：{ini_path}",
+    ])
+
+
+def build_desktop_ini_plan(current_dir, records, snapshot, store=None, skip=(), manifest=None):
+    """读取配置与磁盘现状，生成最小变更计划（配置顺序，其后为待删除项）
+
+    skip 中的文件夹（续跑时上次已完成的）不再计划；
+    不在配置中的文件夹只有 manifest 中登记且未被修改的desktop.ini才计划删除。
+    """
+    configured = {record.section for record in records}
+    orphans = [name for name in snapshot.names() if name not in configured and name not in skip]
+    with concurrent_futures.ThreadPoolExecutor(max_workers=max(1, DESKTOP_INI_WORKERS)) as pool:
+        planned = [
+            pool.submit(plan_folder_desktop_ini, current_dir, snapshot, record, store)
+            for record in records if record.section not in skip
+        ]
+        orphan_items = [pool.submit(plan_orphan_desktop_ini, snapshot, name, manifest) for name in orphans]
+        plan = [future.result() for future in planned]
+        plan += [item for item in (future.result() for future in orphan_items) if item]
+    return plan
+
+
+def print_plan(plan):
+    """打印变更计划（不执行）"""
+    counts = collections.Counter(item.action for item in plan)
+    print(f"\n{'-'*60}")
+    print("📋 变更计划：" + "，".join(
+        f"{PLAN_LABELS[action]} {counts[action]}" for action in PLAN_LABELS if counts[action]
+    ))
+    symbols = {"create": "+", "update": "~", "delete": "-", "skip": "!", "error": "!", "unmanaged": "="}
+    for item in plan:
+        if item.action in symbols:
+            print(f"   {symbols[item.action]} {PLAN_LABELS[item.action]}：{item.folder}")
+
+
+def apply_plan_item(item, snapshot, manifest, store=None):
+    """执行单个计划项，返回（状态, 输出行列表）；异常只影响当前文件夹"""
+    lines = list(item.lines)
+    try:
+        if item.action in ("create", "update"):
+            # 先写图标再写desktop.ini，保证desktop.ini引用的文件一定存在
+            if item.icon_data is not None:
+                store.write(item.icon_path, item.icon_data)
+            replace_desktop_ini(item.ini_path, item.content)
+            remove_extracted_icon(os.path.dirname(item.ini_path))
+            snapshot.set_desktop_ini(item.folder, True)
+            manifest.record(item.folder, item.content)
+            lines.append(f"   ✅ 成功生成desktop.ini")
+            return "written", lines
+        if item.action == "delete":
+            if not ensure_file_writable(item.ini_path):
+                return "failed", lines
+            os.remove(item.ini_path)
+            remove_extracted_icon(os.path.dirname(item.ini_path))
+            snapshot.set_desktop_ini(item.folder, False)
+            manifest.forget(item.folder)
+            lines.append(f"   ✅ 已删除desktop.ini")
+            return "deleted", lines
+        if item.action == "unmanaged":
+            return "unmanaged", lines
+        if item.action == "noop":
+            # 内容与本工具生成的一致，登记到清单（兼容旧版本生成的文件）
+            manifest.record(item.folder, item.content)
+            lines.append(f"   ⏭️  内容未变化，保持原文件")
+            return "unchanged", lines
+        return ("failed" if item.action == "error" else "skipped"), lines
+    except Exception as e:
+        lines.append(f"   ❌ {PLAN_LABELS[item.action]}失败：{str(e)}")
+        return "failed", lines
+
+
+def apply_desktop_ini_plan(plan, snapshot, manifest, store=None, journal=None):
+    """按计划执行（并发、按计划顺序输出），返回（各状态计数, 实际变更的文件夹列表）
+
+    传入 journal 时每个成功的文件夹记入断点续跑日志。
+    """
+    counts = collections.Counter()
+    changed = []
+    with concurrent_futures.ThreadPoolExecutor(max_workers=max(1, DESKTOP_INI_WORKERS)) as pool:
+        futures = [(item, pool.submit(apply_plan_item, item, snapshot, manifest, store)) for item in plan]
+        for item, future in futures:
+            status, lines = future.result()
+            item.status = status
+            counts[status] += 1
+            if journal is not None and status in ("written", "unchanged", "deleted"):
+                journal.step(item.folder, status)
+            if status in ("written", "deleted"):
+                changed.append(item.folder)
+            print("\n".join(lines))
+    manifest.mark_pending(changed)
+    manifest.save()
+    return counts, changed
+
+
+def resume_generated(current_dir, manifest, done):
+    """续跑前补记上次已完成文件夹的清单信息（上次中断时清单可能未保存）"""
+    for folder, status in done.items():
+        if status in ("written", "deleted"):
+            manifest.mark_pending([folder])
+        if status == "deleted":
+            manifest.forget(folder)
+            continue
+        try:
+            with open(os.path.join(current_dir, folder, "desktop.ini"), 'rb') as f:
+                manifest.record(folder, f.read())
+        except OSError:
+            pass
+
+
+def apply_config(root, delete_orphans=False, dry_run=False, resume=True):
+    """按 root 的配置生成desktop.ini（只写入有变化的文件夹），返回各动作的计数
+
+    delete_orphans：不在配置中但有desktop.ini的文件夹是否删除（可传入 fn(待删除项) 询问）；
+    dry_run=True 时只打印变更计划、不写入任何文件；resume 含义同 RunJournal.start。
+    配置无法读取时返回None。
+    """
+    ctx = RootContext.of(root)
+    root = ctx.root
+    records = load_folder_records(ctx)
+    if records is None:
+        return None
+    if not records:
+        print(f"❌ 配置文件中没有任何文件夹")
+        return None
+
+    snapshot = get_folder_snapshot(root)
+    store = IconStore.load(root) if EXTRACT_ICONS else None
+    manifest = DesktopIniManifest.load(root)
+    if dry_run:
+        plan = build_desktop_ini_plan(root, records, snapshot, store, manifest=manifest)
+        print_plan(plan)
+        return collections.Counter(item.action for item in plan)
+
+    journal = RunJournal(root, "generate", signature_of((r.section, r.alias, r.icon) for r in records))
+    try:
+        done = journal.start(resume)
+        if done:
+            resume_generated(root, manifest, done)
+            print(f"ℹ️  续跑：跳过上次已完成的 {len(done)} 个文件夹")
+        plan = build_desktop_ini_plan(root, records, snapshot, store, skip=done, manifest=manifest)
+        print_plan(plan)
+
+        deletes = [item for item in plan if item.action == "delete"]
+        if deletes and not decide(delete_orphans, deletes):
+            plan = [item for item in plan if item.action != "delete"]
+            print(f"ℹ️  保留这些desktop.ini")
+
+        counts, changed = apply_desktop_ini_plan(plan, snapshot, manifest, store, journal)
+        if ctx.use_config_db:
+            with ConfigDb.open(root) as db:
+                db.record_plan(plan)
+        if store is not None:
+            removed = store.collect_garbage(snapshot)
+            store.save()
+            print(f"\nℹ️  {store.summary()}" + (f"，清除未引用图标 {removed} 个" if removed else ""))
+        PLACEHOLDERS.report(root)
+        journal.finish()
+    finally:
+        journal.close()
+
+    total = len(records)
+    written, unchanged = counts["written"], counts["unchanged"]
+    print(f"\n{'-'*60}")
+    print(f"📊 处理结果：成功 {written + unchanged}/{total} 个文件夹"
+          f"（写入 {written}，未变化 {unchanged}，跳过 {counts['skipped']}，失败 {counts['failed']}）")
+    if counts["deleted"]:
+        print(f"   已删除不在配置中的desktop.ini {counts['deleted']} 个")
+    if counts["unmanaged"]:
+        print(f"   保留不在配置中、非本工具管理的desktop.ini {counts['unmanaged']} 个")
+    return counts
+
+
+def preview_desktop_ini_plan():
+    """预览folders.txt → desktop.ini的变更计划（不写入任何文件）"""
+    try:
+        print("\n" + "-" * 60)
+        print("          预览 desktop.ini 变更计划（不写入）          ")
+        print("-" * 60)
+        apply_config(OPERATE_DIR, dry_run=True)
+    except Exception as e:
+        print(f"❌ 总错误：{str(e)}")
+    finally:
+        wait_for_space()
+
+
+def generate_desktop_ini():
+    """按变更计划生成desktop.ini（只写入有变化的文件夹，中断后可续跑）"""
+    try:
+        print("\n" + "-" * 60)
+        print("          生成 desktop.ini（直接生成方式）          ")
+        print("-" * 60)
+        counts = apply_config(OPERATE_DIR, resume=confirm_resume, delete_orphans=lambda deletes: input(
+            f"\n⚠️  有 {len(deletes)} 个文件夹不在配置中、desktop.ini 由本工具生成，是否删除？(y/n)：").strip().lower() == 'y')
+        if counts is not None:
+            print(f"⚠️  提示：请等待直到手动刷新后显示别名")
     except Exception as e:
         print(f"❌ 总错误：{str(e)}")
     finally:
         wait_for_space()
 
 
+# ------------------------------
+# desktop.ini 移动与清理功能
+# ------------------------------
 def move_existing_desktop_ini():
-    """移动已生成的desktop.ini以触发缓存刷新"""
+    """原地替换已生成的desktop.ini以触发缓存刷新（中断后可续跑）"""
+    journal = None
     try:
         print("\n" + "-" * 60)
         print("          移动已生成的desktop.ini（触发刷新）          ")
@@ -721,25 +3137,30 @@ def move_existing_desktop_ini():
         current_dir = OPERATE_DIR
         
         # 查找所有包含desktop.ini的子文件夹
-        target_folders = []
-        for item in os.listdir(current_dir):
-            item_path = os.path.join(current_dir, item)
-            if os.path.isdir(item_path) and not item.startswith('.'):
-                ini_path = os.path.join(item_path, "desktop.ini")
-                if os.path.exists(ini_path):
-                    target_folders.append((item, item_path, ini_path))
+        snapshot = get_folder_snapshot(current_dir)
+        target_folders = [
+            (entry.name, entry.path, os.path.join(entry.path, "desktop.ini"))
+            for entry in snapshot.folders
+            if snapshot.has_desktop_ini(entry.name)
+        ]
         
         total = len(target_folders)
         if total == 0:
             print("ℹ️  未找到任何已生成的desktop.ini文件")
             return
 
-        print(f"找到 {total} 个包含desktop.ini的文件夹，准备执行移动操作...\n")
+        print(f"找到 {total} 个包含desktop.ini的文件夹，准备执行替换操作...\n")
         processed = 0
-        
-        # 创建临时目录用于移动操作
-        temp_dir = os.path.join(current_dir, ".temp_ini_move")
-        os.makedirs(temp_dir, exist_ok=True)
+        replaced = []
+        manifest = DesktopIniManifest.load(current_dir)
+        journal = RunJournal(current_dir, "move", signature_of(name for name, _, _ in target_folders))
+        done = journal.start(confirm_resume)
+        if done:
+            # 上次已替换的只需刷新
+            replaced = [(name, path) for name, path, _ in target_folders if name in done]
+            manifest.mark_pending(name for name, _ in replaced)
+            print(f"ℹ️  续跑：跳过上次已替换的 {len(replaced)} 个文件夹")
+            target_folders = [target for target in target_folders if target[0] not in done]
         
         for folder_name, folder_path, ini_path in target_folders:
             print(f"\n{'-'*40}")
@@ -747,54 +3168,34 @@ def move_existing_desktop_ini():
             print(f"   原文件路径：{ini_path}")
             
             try:
-                # 1. 确保文件可写
-                if not ensure_file_writable(ini_path):
-                    print(f"   ⚠️  无法修改文件属性，跳过")
-                    continue
-                
-                # 2. 生成临时文件名
-                temp_ini_name = f"temp_{hash(folder_name)}_{int(time.time())}_desktop.ini"
-                temp_ini_path = os.path.join(temp_dir, temp_ini_name)
-                
-                # 3. 移动到临时目录
-                shutil.move(ini_path, temp_ini_path)
-                print(f"   已移动到临时位置：{temp_ini_path}")
-                
-                # 4. 移回原位置
-                shutil.move(temp_ini_path, ini_path)
-                print(f"   已移回原位置：{ini_path}")
-                
-                # 5. 恢复文件属性（系统+隐藏）
-                win32api.SetFileAttributes(
-                    ini_path,
-                    win32con.FILE_ATTRIBUTE_HIDDEN | win32con.FILE_ATTRIBUTE_SYSTEM
-                )
+                # 1. 读取现有内容
+                with open(ini_path, 'rb') as f:
+                    content = f.read()
                 
-                # 6. 立即触发刷新
-                refresh_success, cache_success = refresh_folder(folder_path)
+                # 2. 同目录临时文件+一次重命名替换（原子操作，触发系统变更通知）
+                replace_desktop_ini(ini_path, content)
+                print(f"   已原地替换：{ini_path}")
+                replaced.append((folder_name, folder_path))
+                manifest.mark_pending([folder_name])
+                journal.step(folder_name, "replaced")
+            except Exception as e:
+                print(f"   ❌ 处理失败：{str(e)}（原文件未改动）")
+        manifest.save()
+        
+        # 3. 对替换成功的文件夹批量刷新
+        if replaced:
+            print(f"\n正在批量刷新 {len(replaced)} 个文件夹...")
+            scheduler = RefreshScheduler()
+            results = scheduler.run([folder_path for _, folder_path in replaced])
+            for (folder_name, _), (refresh_success, cache_success) in zip(replaced, results.values()):
                 if refresh_success:
                     processed += 1
-                    print(f"   ✅ 移动并刷新成功")
+                    manifest.clear_pending([folder_name])
                 else:
-                    print(f"   ⚠️  移动成功但刷新失败")
-                
-                time.sleep(0.2)  # 控制节奏
-                
-            except Exception as e:
-                print(f"   ❌ 处理失败：{str(e)}")
-                # 尝试恢复文件（如果临时文件存在）
-                if os.path.exists(temp_ini_path):
-                    try:
-                        shutil.move(temp_ini_path, ini_path)
-                        print(f"   ℹ️  已恢复文件到原位置")
-                    except:
-                        pass
-        
-        # 清理临时目录
-        try:
-            shutil.rmtree(temp_dir)
-        except:
-            pass
+                    print(f"   ⚠️  [{folder_name}] 替换成功但刷新失败")
+            print(f"⏱️  {scheduler.summary(len(replaced))}")
+        manifest.save()
+        journal.finish()
         
         print(f"\n{'-'*60}")
         print(f"📊 处理结果：成功 {processed}/{total} 个文件")
@@ -802,30 +3203,117 @@ def move_existing_desktop_ini():
     except Exception as e:
         print(f"❌ 总错误：{str(e)}")
     finally:
+        if journal is not None:
+            journal.close()
         wait_for_space()
 
+def delete_desktop_ini_file(file_path, current_dir, manifest):
+    """删除单个desktop.ini（并记为待刷新），返回是否成功"""
+    if not ensure_file_writable(file_path):
+        return False
+    try:
+        os.remove(file_path)
+        remove_extracted_icon(os.path.dirname(file_path))
+        rel_path = os.path.relpath(file_path, current_dir)
+        print(f"✅ 已删除：{rel_path}")
+        folder = os.path.dirname(rel_path)
+        if folder:
+            manifest.mark_pending([folder])
+        return True
+    except Exception as e:
+        print(f"❌ 删除失败 {file_path}：{str(e)}")
+        return False
+
+
+def clean_root(root, delete_modified=False, scan_orphans=False, delete_orphans=False, dry_run=False):
+    """按清单删除 root 下本工具生成的desktop.ini，返回删除的文件数
+
+    delete_modified：写入后被手动修改过的文件是否也删除（可传入 fn(修改过的路径列表) 询问）；
+    scan_orphans：是否有限深度扫描未登记的desktop.ini（可传入 fn() 询问）；
+    delete_orphans：扫描到的未登记文件是否删除（可传入 fn(路径列表) 询问）；
+    dry_run=True 时只打印清理计划、不删除任何文件，返回计划删除的文件数。
+    """
+    ctx = RootContext.of(root)
+    root = ctx.root
+    deleted = 0
+    manifest = DesktopIniManifest.load(root)
+    targets = []  # 要删除的（清单键或None, 路径）
+    modified = []
+    kept = 0
+
+    # 1. 清单中的文件：内容与写入时一致才删除
+    for key, digest in list(manifest.entries.items()):
+        file_path = manifest.ini_path(key)
+        try:
+            current_digest = file_digest(file_path)
+        except OSError:
+            manifest.forget(key)  # 已不存在
+            continue
+        (targets if current_digest == digest else modified).append((key, file_path))
+
+    if modified:
+        print(f"\n⚠️  有 {len(modified)} 个由本工具生成的desktop.ini已被手动修改：")
+        for key, file_path in modified:
+            print(f"   {os.path.relpath(file_path, root)}")
+        if decide(delete_modified, [file_path for _, file_path in modified]):
+            targets += modified
+        else:
+            kept += len(modified)
+
+    # 2. 可选：有限深度扫描未登记的desktop.ini
+    if decide(scan_orphans):
+        orphans = find_orphan_desktop_ini(root, manifest, encoding=ctx.encoding)
+        if not orphans:
+            print("ℹ️  未发现未登记的desktop.ini")
+        else:
+            print(f"\nℹ️  发现 {len(orphans)} 个未登记的desktop.ini：")
+            for file_path in orphans:
+                print(f"   {os.path.relpath(file_path, root)}")
+            if decide(delete_orphans, orphans):
+                targets += [(None, file_path) for file_path in orphans]
+            else:
+                kept += len(orphans)
+
+    if dry_run:
+        print(f"\n{'-'*60}")
+        print(f"📋 清理计划：删除 {len(targets)}，保留 {kept}")
+        for _, file_path in targets:
+            print(f"   - 删除：{os.path.relpath(file_path, root)}")
+        return len(targets)
+
+    for key, file_path in targets:
+        if delete_desktop_ini_file(file_path, root, manifest):
+            if key is not None:
+                manifest.forget(key)
+            deleted += 1
+    manifest.save()
+
+    snapshot = get_folder_snapshot(root)
+    snapshot.forget_desktop_ini()
+
+    # 3. 清除已没有desktop.ini引用的共享图标
+    store = IconStore.load(root)
+    removed = store.collect_garbage(snapshot)
+    store.save()
+    if removed:
+        print(f"ℹ️  已清除未引用的图标 {removed} 个")
+    print(f"\n📊 清理完成：共删除 {deleted} 个文件")
+    return deleted
+
+
 def clean_desktop_ini():
-    """清理desktop.ini"""
+    """清理desktop.ini（按清单删除本工具生成的文件，可选有限深度扫描未登记文件）"""
     try:
         print("\n" + "-" * 40)
         print("          清理 desktop.ini          ")
         print("-" * 40)
-        current_dir = OPERATE_DIR
-        deleted = 0
-        
-        for root, _, files in os.walk(current_dir):
-            for file in files:
-                if file == "desktop.ini":
-                    file_path = os.path.join(root, file)
-                    if ensure_file_writable(file_path):
-                        try:
-                            os.remove(file_path)
-                            deleted += 1
-                            print(f"✅ 已删除：{os.path.relpath(file_path, current_dir)}")
-                        except Exception as e:
-                            print(f"❌ 删除失败 {file_path}：{str(e)}")
-        
-        print(f"\n📊 清理完成：共删除 {deleted} 个文件")
+        clean_root(
+            OPERATE_DIR,
+            delete_modified=lambda paths: input("是否也删除这些文件？(y/n)：").strip().lower() == 'y',
+            scan_orphans=lambda: input(
+                f"\n是否扫描未登记的desktop.ini（深度≤{CLEAN_ORPHAN_DEPTH}）？(y/n)：").strip().lower() == 'y',
+            delete_orphans=lambda paths: input("是否删除这些未登记的文件？(y/n)：").strip().lower() == 'y',
+        )
         print(f"⚠️  提示：建议执行选项9一次")
     except Exception as e:
         print(f"❌ 清理失败：{str(e)}")
@@ -836,74 +3324,203 @@ def clean_desktop_ini():
 # ------------------------------
 # 手动刷新功能（核心流程）
 # ------------------------------
-def manual_refresh_all():
-    """循环处理文件夹（含缓存生成）+ 最终系统缓存清理"""
+def desktop_ini_state(root, folder):
+    """文件夹中desktop.ini的内容哈希（不存在时为空串），用于判断刷新后是否又发生过变化"""
     try:
-        print("\n" + "-" * 60)
-        print("          刷新所有文件夹并清理系统缓存          ")
-        print("-" * 60)
-        
-        current_dir = OPERATE_DIR
-        folders = [
-            f for f in os.listdir(current_dir)
-            if os.path.isdir(os.path.join(current_dir, f)) and not f.startswith('.')
-        ]
-        
+        return file_digest(os.path.join(root, folder, "desktop.ini"))
+    except OSError:
+        return ""
+
+
+def refresh_root(root, refresh_all=False, global_cache=False, resume=True, dry_run=False):
+    """刷新 root 下上次生成/替换/清理实际变化的文件夹，返回（刷新成功数, 需刷新数）
+
+    没有记录到变化时，refresh_all 决定是否刷新全部文件夹（可传入 fn() 询问）；
+    global_cache 决定最后是否执行全局图标缓存清理（重启资源管理器，可传入 fn() 询问）；
+    dry_run=True 时只打印刷新计划，不通知资源管理器、不修改清单，返回（0, 需刷新数）。
+    分批刷新，每批完成后记入断点续跑日志并保存清单，中断后再次执行从下一批继续；
+    出错时确保资源管理器在运行后再抛出异常。
+    """
+    root = RootContext.of(root).root
+    journal = None
+    try:
+        manifest = DesktopIniManifest.load(root)
+        snapshot = get_folder_snapshot(root)
+        folders = snapshot.names()
+        mode = "pending" if manifest.pending else "all"
+        cached = []
+        if manifest.pending:
+            # 已不存在的文件夹无需刷新
+            manifest.clear_pending([f for f in manifest.pending if f.split("/")[0] not in folders])
+            folders = [f for f in folders if f in manifest.pending]
+            print(f"ℹ️  上次操作共有 {len(manifest.pending)} 个文件夹发生变化，仅刷新这些文件夹")
+        elif not decide(refresh_all):
+            folders = []
+
+        # 读取图标缓存副本，已缓存新图标的文件夹不再刷新
+        if VERIFY_ICON_CACHE and folders:
+            state = IconCacheState()
+            if state.can_verify:
+                cached, folders = split_cached_folders(root, folders, state)
+                # 图标缓存看不出别名变化：已缓存的文件夹仍通知资源管理器重新读取desktop.ini，只是不再触发缓存生成
+                if not dry_run:
+                    for folder in cached:
+                        notify_folder_updated(os.path.join(root, folder))
+                    manifest.clear_pending(cached)
+                print(f"ℹ️  图标缓存中已有 {len(cached)} 个文件夹的新图标，只通知重新读取desktop.ini，不再生成缓存")
+            else:
+                print(f"ℹ️  图标缓存中没有可核对的路径记录（{state.entries} 条哈希记录），按全部需要刷新处理")
+
+        if dry_run:
+            print(f"\n{'-'*60}")
+            print(f"📋 刷新计划：刷新 {len(folders)}，仅通知 {len(cached)}")
+            for folder in folders:
+                print(f"   ~ 刷新：{folder}")
+            for folder in cached:
+                print(f"   = 仅通知：{folder}")
+            return 0, len(folders)
+
+        if folders:
+            # 日志中记录刷新时desktop.ini的内容哈希：中断后又重新生成过的文件夹哈希不同，续跑时照样刷新
+            states = {folder: desktop_ini_state(root, folder) for folder in folders}
+            journal = RunJournal(root, "refresh", mode)
+            done = journal.start(resume)
+            if done:
+                skipped = [folder for folder in folders if done.get(folder) == states[folder]]
+                folders = [folder for folder in folders if done.get(folder) != states[folder]]
+                manifest.clear_pending(skipped)
+                if skipped:
+                    print(f"ℹ️  续跑：跳过上次已刷新、之后未再变化的 {len(skipped)} 个文件夹")
+
         total = len(folders)
         if total == 0:
+            manifest.save()
+            if journal is not None:
+                journal.finish()
             print("ℹ️  没有找到可刷新的文件夹")
-            return
-        
+            return 0, 0
+
         print(f"即将处理 {total} 个文件夹（含缓存生成）...\n")
         success_count = 0
         cache_fail_count = 0  # 统计缓存生成失败次数
-        
-        for i, folder in enumerate(folders, 1):
-            folder_path = os.path.join(current_dir, folder)
-            print(f"[{i}/{total}] 处理文件夹：{folder}")
-            
-            # 刷新文件夹并触发缓存生成（返回两个状态：整体刷新成功/缓存生成成功）
-            refresh_success, cache_success = refresh_folder(folder_path)
-            
-            if refresh_success:
-                success_count += 1
-                if not cache_success:
-                    cache_fail_count += 1
-                    # 仅在失败次数较少时提示，避免刷屏
-                    if cache_fail_count <= 5:
-                        print(f"   ⚠️  缓存生成临时失败，最终清理会修复")
-                    elif cache_fail_count == 6:
-                        print(f"   ⚠️  更多缓存失败将不再提示，最终清理会统一处理")
+
+        # 分批刷新文件夹并触发缓存生成（每个文件夹两个状态：整体刷新成功/缓存生成成功），每批完成即打印结果
+        scheduler = RefreshScheduler()
+        i = 0
+        for start in range(0, total, max(1, REFRESH_CHUNK)):
+            chunk = folders[start:start + max(1, REFRESH_CHUNK)]
+            results = scheduler.run([os.path.join(root, folder) for folder in chunk], attributes={
+                entry.path: entry.attributes for entry in map(snapshot.get, chunk) if entry is not None
+            })
+            chunk_outcomes = list(zip(chunk, results.values()))
+            refreshed = [folder for folder, (refresh_success, _) in chunk_outcomes if refresh_success]
+            manifest.clear_pending(refreshed)
+            manifest.save()
+            for folder in refreshed:
+                journal.step(folder, states[folder])
+            for folder, (refresh_success, cache_success) in chunk_outcomes:
+                i += 1
+                print(f"[{i}/{total}] 处理文件夹：{folder}")
+                if refresh_success:
+                    success_count += 1
+                    if not cache_success:
+                        cache_fail_count += 1
+                        # 仅在失败次数较少时提示，避免刷屏
+                        if cache_fail_count <= 5:
+                            print(f"   ⚠️  缓存生成临时失败，最终清理会修复")
+                        elif cache_fail_count == 6:
+                            print(f"   ⚠️  更多缓存失败将不再提示，最终清理会统一处理")
+                    else:
+                        print(f"   ✅ 刷新及缓存生成成功")
                 else:
-                    print(f"   ✅ 刷新及缓存生成成功")
-            else:
-                print(f"   ⚠️  文件夹刷新失败")
-            
-            time.sleep(0.1)  # 控制节奏，避免系统压力
-        
+                    print(f"   ⚠️  文件夹刷新失败")
+
+        journal.finish()
         print(f"\n{'-'*40}")
         print(f"📊 文件夹处理结果：成功 {success_count}/{total} 个")
+        print(f"⏱️  {scheduler.summary(total)}")
+        PLACEHOLDERS.report(root)
         if cache_fail_count > 0:
-            print(f"   ℹ️  缓存生成临时失败 {cache_fail_count} 次，将通过最终清理修复")
-        
-        # 最终系统级缓存清理（确保所有图标生效）
-        refresh_system_icon_cache()
-        
-        print(f"\n{'-'*60}")
-        print("✅ 所有操作已完成")
+            print(f"   ℹ️  缓存生成临时失败 {cache_fail_count} 次，可用全局缓存清理修复")
+
+        # 全局图标缓存清理会重启资源管理器并让全机重建图标，仅在确认后执行
+        if decide(global_cache):
+            refresh_system_icon_cache(open_dir=root)
+        return success_count, total
+    except Exception:
+        controller = ExplorerController()
+        controller.ensure_running()  # 确保系统外壳启动
+        controller.open_folder(root)
+        raise
+    finally:
+        if journal is not None:
+            journal.close()
+
+
+def manual_refresh_all():
+    """只刷新上次生成/替换/清理实际变化的文件夹；全局图标缓存清理需手动确认"""
+    try:
+        print("\n" + "-" * 60)
+        print("          刷新文件夹图标缓存          ")
+        print("-" * 60)
+        success_count, total = refresh_root(
+            OPERATE_DIR,
+            resume=confirm_resume,
+            refresh_all=lambda: input(
+                "ℹ️  没有记录到待刷新的变化，是否刷新全部文件夹？(y/n)：").strip().lower() == 'y',
+            global_cache=lambda: input(
+                "\n⚠️  是否执行全局图标缓存清理（重启资源管理器，全机重建图标）？(y/n)：").strip().lower() == 'y',
+        )
+        if total:
+            print(f"\n{'-'*60}")
+            print("✅ 所有操作已完成")
     except Exception as e:
         print(f"❌ 刷新失败：{str(e)}")
-        subprocess.Popen(["explorer.exe", OPERATE_DIR])
-        time.sleep(1)
-        subprocess.Popen(["explorer.exe"])  # 确保系统外壳启动
     finally:
         wait_for_space()
 
+
+def sync_config_db():
+    """SQLite 配置库与 folders.txt 互相导入导出（手动编辑仍可通过 folders.txt 进行）"""
+    try:
+        print("\n" + "-" * 40)
+        print("          SQLite 配置库 ⇄ folders.txt          ")
+        print("-" * 40)
+        current_dir = OPERATE_DIR
+        txt_path = os.path.join(current_dir, FOLDERS_TXT_NAME)
+        source = "SQLite 配置库" if USE_CONFIG_DB else FOLDERS_TXT_NAME
+        print(f"ℹ️  当前配置来源：{source}（可修改脚本顶部 USE_CONFIG_DB 切换）")
+        print(f"1. 从 {FOLDERS_TXT_NAME} 导入到配置库（替换配置库内容）")
+        print(f"2. 从配置库导出到 {FOLDERS_TXT_NAME}")
+        choice = input("请输入选择（1/2，其他=返回）：").strip()
+        if choice == '1':
+            if not os.path.exists(txt_path):
+                print(f"❌ 错误：未找到配置文件 {txt_path}")
+                return
+            backup_folders_txt(os.path.join(current_dir, CONFIG_DB_NAME))
+            with ConfigDb.open(current_dir) as db:
+                imported, deleted, errors = db.import_txt(current_dir, txt_path)
+            print(f"✅ 已导入 {imported} 个文件夹，移除 {deleted} 个（{CONFIG_DB_NAME}）")
+            for line_no, message in errors[:10]:
+                print(f"   ⚠️  第 {line_no} 行：{message}")
+        elif choice == '2':
+            backup_folders_txt(txt_path)
+            with ConfigDb.open(current_dir) as db:
+                exported = db.export_txt(txt_path)
+            print(f"✅ 已导出 {exported} 个文件夹到 {txt_path}（编码：{FOLDERS_ENCODING}）")
+    except Exception as e:
+        print(f"❌ 操作失败：{str(e)}")
+    finally:
+        wait_for_space()
+
+
 # ------------------------------
 # 主函数
 # ------------------------------
 def main():
+    global FOLDERS_ENCODING
     try:
+        FOLDERS_ENCODING = detect_folders_encoding()
         if not check_dependency():
             wait_for_space()
             return
@@ -912,6 +3529,7 @@ def main():
         if not OPERATE_DIR:
             print("❌ 未选择有效目录，退出")
             return
+        recover_interrupted_files(OPERATE_DIR)
 
         while True:
             print(f"\n" + "=" * 60)
@@ -922,13 +3540,17 @@ def main():
             print("2. 交互生成 folders.txt")
             print("3. ⚠️手动修改 folders.txt")
             print("4. 批量生成 desktop.ini")
+            print("P. 预览 desktop.ini 变更计划（不写入）")
             print("5. ⚠️等待直到手动刷新后显示别名，或者用功能9")
             print("6. 批量移动一次 desktop.ini 刷新缓存")
             print("")
             print("7. 自动生成 folders.txt [自动选择可执行文件]")
             print("8. 交互更新 folders.txt [仅加入新添加文件夹]")
+            print("D. SQLite 配置库 ⇄ folders.txt 导入导出")
+            print("B. 从备份恢复 folders.txt / 配置库")
             print("")
-            print("9. ⚠️终极大招，多种方式刷新缓存")
+            print("9. ⚠️终极大招，刷新变化文件夹的图标缓存（可选全局清理）")
+            print("R. 重新读取目录（外部有改动时使用）")
             print("")
             print("0. 退出")
             print("")
@@ -942,6 +3564,8 @@ def main():
                 generate_folders_txt_interactive()
             elif choice == '4':
                 generate_desktop_ini()
+            elif choice.upper() == 'P':
+                preview_desktop_ini_plan()
             elif choice == '6':  # 新增选项
                 move_existing_desktop_ini()
             elif choice == '7':
@@ -950,6 +3574,13 @@ def main():
                 update_folders_txt_interactive()
             elif choice == '9':
                 manual_refresh_all()
+            elif choice.upper() == 'D':
+                sync_config_db()
+            elif choice.upper() == 'B':
+                restore_backup()
+            elif choice.upper() == 'R':
+                snapshot = get_folder_snapshot(OPERATE_DIR, refresh=True)
+                print(f"✅ 已重新读取目录，共 {len(snapshot.folders)} 个文件夹")
             elif choice == '0':  # 原退出选项
                 print("\n✅ 程序退出，感谢使用！")
                 break
@@ -961,10 +3592,109 @@ def main():
         wait_for_space()
 
 
+# ------------------------------
+# 命令行接口（无交互批量处理）
+# ------------------------------
+def build_arg_parser():
+    """命令行参数：各子命令对应菜单中的一个功能，不会等待任何输入"""
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--root", default=os.getcwd(), help="操作目录（默认为当前目录）")
+    common.add_argument("--config-db", action="store_true",
+                        help=f"使用 SQLite 配置库 {CONFIG_DB_NAME} 代替 {FOLDERS_TXT_NAME}")
+    common.add_argument("--encoding", help=f"{FOLDERS_TXT_NAME} 编码（默认按系统代码页检测）")
+    policy_help = "EXE选择策略：best=按图标质量排序取第一个，first=层级最浅的第一个，single=只有唯一候选时才选"
+
+    parser = argparse.ArgumentParser(prog="IconFolio", description="批量自定义文件夹别名和图标；不带参数运行时进入交互菜单")
+    parser.add_argument("--version", action="version", version=VERSION)
+    commands = parser.add_subparsers(dest="command", metavar="命令")
+
+    p = commands.add_parser("scan", parents=[common], help="扫描各文件夹的候选EXE（只读）")
+    p.add_argument("--policy", choices=sorted(EXE_POLICIES), default="best", help=policy_help)
+    p.add_argument("--all", action="store_true", help="列出全部候选EXE")
+    p.add_argument("--json", action="store_true", help="每个文件夹输出一行 JSON")
+
+    p = commands.add_parser("generate", parents=[common], help=f"按选择策略生成 {FOLDERS_TXT_NAME}")
+    p.add_argument("--policy", choices=sorted(EXE_POLICIES), default="best", help=policy_help)
+    p.add_argument("--update", action="store_true", help="只追加配置中还没有的文件夹")
+
+    p = commands.add_parser("apply", parents=[common], help="按配置生成 desktop.ini")
+    p.add_argument("--dry-run", action="store_true", help="只打印变更计划，不写入")
+    p.add_argument("--delete-orphans", action="store_true", help="删除不在配置中的文件夹的 desktop.ini")
+    p.add_argument("--no-resume", action="store_true", help="上次中断时从头开始，不续跑")
+
+    p = commands.add_parser("clean", parents=[common], help="删除本工具生成的 desktop.ini")
+    p.add_argument("--include-modified", action="store_true", help="写入后被手动修改过的也删除")
+    p.add_argument("--orphans", action="store_true", help=f"同时删除未登记的 desktop.ini（深度≤{CLEAN_ORPHAN_DEPTH}）")
+    p.add_argument("--dry-run", action="store_true", help="只打印清理计划，不删除")
+
+    p = commands.add_parser("refresh", parents=[common], help="刷新变化文件夹的图标缓存")
+    p.add_argument("--all", action="store_true", help="没有记录到变化时刷新全部文件夹")
+    p.add_argument("--global-cache", action="store_true", help="最后执行全局图标缓存清理（重启资源管理器）")
+    p.add_argument("--dry-run", action="store_true", help="只打印刷新计划，不刷新")
+    p.add_argument("--no-resume", action="store_true", help="上次中断时从头开始，不续跑")
+    return parser
+
+
+def cli_main(argv=None):
+    """命令行入口，返回退出码（0=成功，1=有失败，2=参数错误）"""
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 2
+    root = os.path.abspath(args.root)
+    if not os.path.isdir(root):
+        print(f"❌ 目录不存在：{root}", file=sys.stderr)
+        return 2
+    quiet = args.command == "scan" and args.json
+    ctx = RootContext(root, encoding=args.encoding or detect_folders_encoding(verbose=not quiet),
+                      use_config_db=USE_CONFIG_DB or args.config_db)
+
+    try:
+        if args.command == "scan":
+            failed = 0
+            for folder, candidates, chosen, error in scan_root(ctx, args.policy, list_all=args.all):
+                failed += error is not None
+                if args.json:
+                    print(json.dumps({"folder": folder, "candidates": candidates, "chosen": chosen,
+                                      "error": str(error) if error else None}, ensure_ascii=False))
+                elif error:
+                    print(f"❌ {folder}：扫描出错：{str(error)}")
+                else:
+                    print(f"{'✅' if chosen else '⚠️ '} {folder}：{chosen or '（未选择）'}（{len(candidates)} 个候选）")
+                    if args.all:
+                        for rel_path in candidates:
+                            print(f"      {rel_path}")
+            return 1 if failed else 0
+
+        if not getattr(args, "dry_run", False):
+            recover_interrupted_files(root)  # 预览不写入任何文件，临时文件留到真正执行时再处理
+        if args.command == "generate":
+            write_config(ctx, policy=args.policy, update=args.update)
+        elif args.command == "apply":
+            counts = apply_config(ctx, delete_orphans=args.delete_orphans, dry_run=args.dry_run,
+                                  resume=not args.no_resume)
+            return 1 if counts is None or counts["failed"] else 0
+        elif args.command == "clean":
+            clean_root(ctx, delete_modified=args.include_modified,
+                       scan_orphans=args.orphans, delete_orphans=args.orphans, dry_run=args.dry_run)
+        elif args.command == "refresh":
+            success_count, total = refresh_root(ctx, refresh_all=args.all,
+                                                global_cache=args.global_cache, resume=not args.no_resume,
+                                                dry_run=args.dry_run)
+            return 0 if args.dry_run or success_count == total else 1
+    except Exception as e:
+        print(f"❌ {args.command} 失败：{str(e)}", file=sys.stderr)
+        return 1
+    return 0
+
+
 # ------------------------------
 # 程序入口
 # ------------------------------
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(cli_main())
     if os.name != 'nt':
         print("❌ 错误：该工具仅支持 Windows 系统")
         wait_for_space()
@@ -0,0 +1,44 @@
+import os
+import sys
+import types
+
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+
+class FakeWin32Api:
+    """pywin32 的桩：文件属性记在字典里（不影响真实文件），外壳通知只记录路径"""
+
+    def __init__(self):
+        self.attributes = {}
+        self.notified = []
+
+    def GetFileAttributes(self, path):
+        if not os.path.exists(path):
+            raise OSError(path)
+        return self.attributes.get(os.path.abspath(path), 0x80)
+
+    def SetFileAttributes(self, path, attributes):
+        self.attributes[os.path.abspath(path)] = attributes
+
+    def SHChangeNotify(self, event, flags, path, _=None):
+        self.notified.append(path)
+
+
+@pytest.fixture
+def win32(monkeypatch):
+    import IconFolio
+    api = FakeWin32Api()
+    constants = types.SimpleNamespace(FILE_ATTRIBUTE_READONLY=0x1, FILE_ATTRIBUTE_HIDDEN=0x2,
+                                      FILE_ATTRIBUTE_SYSTEM=0x4)
+    shellcon = types.SimpleNamespace(SHCNE_UPDATEDIR=0x1000, SHCNE_UPDATEITEM=0x2000, SHCNF_PATH=0x5,
+                                     SHCNF_FLUSH=0x1000, SHCNF_FLUSHNOWAIT=0x2000)
+    monkeypatch.setattr(IconFolio, "win32api", api)
+    monkeypatch.setattr(IconFolio, "win32con", constants)
+    monkeypatch.setattr(IconFolio, "shell", api)
+    monkeypatch.setattr(IconFolio, "shellcon", shellcon)
+    monkeypatch.setattr(IconFolio, "DESKTOP_INI_ENCODING", "gbk")  # "ansi" 只在 Windows 上可用
+    return api
@@ -0,0 +1,67 @@
+"""配置备份库：内容去重、按份数轮换、迁移旧版备份、恢复"""
+import os
+
+import pytest
+
+import IconFolio
+
+
+@pytest.fixture
+def root(tmp_path, win32):
+    return tmp_path
+
+
+def backup(store, root, text):
+    path = root / IconFolio.FOLDERS_TXT_NAME
+    path.write_text(text, encoding="utf-8")
+    return store.backup(str(path))
+
+
+def contents(store):
+    return [store.read(entry).decode("utf-8") for entry in store.entries]
+
+
+def blobs(store):
+    return sorted(name for name in os.listdir(store.dir) if name.endswith(".gz"))
+
+
+def test_unchanged_content_is_not_backed_up_again(root):
+    store = IconFolio.BackupStore(str(root))
+    assert backup(store, root, "X")
+    assert not backup(store, root, "X")
+    assert backup(store, root, "Y")
+    assert contents(IconFolio.BackupStore(str(root))) == ["X", "Y"]
+
+
+def test_rotation_keeps_newest_and_removes_unused_blobs(root):
+    store = IconFolio.BackupStore(str(root), keep=2)
+    for text in ("A", "B", "A", "C"):
+        backup(store, root, text)
+    assert contents(store) == ["A", "C"]
+    assert len(blobs(store)) == 2
+
+
+def test_migrated_backups_survive_rotation(root):
+    store = IconFolio.BackupStore(str(root), keep=1)
+    backup(store, root, "X")
+    # 旧版备份与轮换中的最近一份内容相同，也要单独记录
+    (root / "folders-20240101_120000.txt").write_text("X", encoding="utf-8")
+    (root / "folders-20240102_120000.txt").write_text("old", encoding="utf-8")
+    assert store.migrate_legacy() == 2
+    assert not [name for name in os.listdir(root) if name.startswith("folders-")]
+    backup(store, root, "Y")
+    backup(store, root, "Z")
+    store = IconFolio.BackupStore(str(root), keep=1)
+    assert sorted(contents(store)) == ["X", "Z", "old"]
+    assert sorted(entry["time"] for entry in store.entries if entry.get("legacy")) == [
+        "20240101_120000", "20240102_120000"]
+
+
+def test_restore_backs_up_current_content_first(root):
+    store = IconFolio.BackupStore(str(root))
+    backup(store, root, "old")
+    entry = store.entries[-1]
+    (root / IconFolio.FOLDERS_TXT_NAME).write_text("new", encoding="utf-8")
+    assert store.restore(entry) == str(root / IconFolio.FOLDERS_TXT_NAME)
+    assert (root / IconFolio.FOLDERS_TXT_NAME).read_text(encoding="utf-8") == "old"
+    assert contents(store) == ["old", "new"]
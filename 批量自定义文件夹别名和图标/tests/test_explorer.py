@@ -0,0 +1,103 @@
+"""重启资源管理器：用假的进程后端验证按状态轮询、共用时间预算和出错时恢复"""
+import IconFolio
+
+
+class FakeBackend:
+    """模拟资源管理器：结束/启动后要被轮询若干次才真正退出/就绪；文件可被占用若干次"""
+
+    def __init__(self, exit_after=2, ready_after=2, locks=None):
+        self.running = True
+        self.exit_after = exit_after
+        self.ready_after = ready_after
+        self.locks = dict(locks or {})  # 路径 -> 仍被占用的次数（None=一直占用）
+        self.files = set(self.locks)
+        self.calls = []
+        self._exit_polls = self._ready_polls = None
+
+    def is_running(self, image_name):
+        if self._exit_polls is not None:
+            self._exit_polls -= 1
+            if self._exit_polls <= 0:
+                self.running = False
+                self._exit_polls = None
+        return self.running
+
+    def kill(self, image_name):
+        self.calls.append(("kill", image_name))
+        self._exit_polls = self.exit_after
+
+    def start(self, args):
+        self.calls.append(("start", *args))
+        if args == ["explorer.exe"]:
+            self.running = True
+            self._ready_polls = self.ready_after
+
+    def run(self, args):
+        self.calls.append(("run", *args))
+
+    def shell_ready(self):
+        if self._ready_polls is None:
+            return False
+        self._ready_polls -= 1
+        return self._ready_polls <= 0
+
+    def remove_file(self, path):
+        if path not in self.files:
+            raise FileNotFoundError(path)
+        remaining = self.locks[path]
+        if remaining is None or remaining > 0:
+            self.locks[path] = None if remaining is None else remaining - 1
+            raise PermissionError(path)
+        self.files.discard(path)
+        self.calls.append(("remove", path))
+
+
+def test_stop_and_start_poll_real_state():
+    backend = FakeBackend(exit_after=3, ready_after=3)
+    controller = IconFolio.ExplorerController(backend, budget=5)
+    assert controller.stop()
+    assert not backend.running
+    assert controller.start()
+    assert controller.ensure_running()
+    assert backend.calls == [("kill", "explorer.exe"), ("start", "explorer.exe")]
+
+
+def test_shared_budget_times_out():
+    backend = FakeBackend(exit_after=10 ** 9)
+    controller = IconFolio.ExplorerController(backend, budget=0.2)
+    assert not controller.stop()
+    assert controller.remaining() == 0
+    assert not controller.start()  # 预算已用完，不再等待
+
+
+def test_delete_files_waits_for_unlock():
+    backend = FakeBackend(locks={"a.db": 2, "b.db": None})
+    controller = IconFolio.ExplorerController(backend, budget=0.5)
+    deleted, failed = controller.delete_files(["a.db", "gone.db", "b.db"])
+    assert deleted == ["a.db", "gone.db"]
+    assert failed == ["b.db"]
+
+
+def test_refresh_system_icon_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(IconFolio, "icon_cache_files", lambda: ["IconCache.db"])
+    backend = FakeBackend(locks={"IconCache.db": 1})
+    controller = IconFolio.ExplorerController(backend, budget=5)
+    assert IconFolio.refresh_system_icon_cache(controller, open_dir=str(tmp_path))
+    assert backend.calls == [
+        ("kill", "explorer.exe"),
+        ("remove", "IconCache.db"),
+        ("start", "explorer.exe"),
+        ("run", "ie4uinit.exe", "-ClearIconCache"),
+        ("start", "explorer.exe", str(tmp_path)),
+    ]
+
+
+def test_refresh_system_icon_cache_restarts_explorer_on_error(monkeypatch, tmp_path):
+    def broken():
+        raise OSError("拒绝访问")
+    monkeypatch.setattr(IconFolio, "icon_cache_files", broken)
+    backend = FakeBackend()
+    controller = IconFolio.ExplorerController(backend, budget=1)
+    assert not IconFolio.refresh_system_icon_cache(controller, open_dir=str(tmp_path))
+    assert backend.running
+    assert backend.calls[-2:] == [("start", "explorer.exe"), ("start", "explorer.exe", str(tmp_path))]
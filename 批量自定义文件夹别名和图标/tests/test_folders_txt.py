@@ -0,0 +1,72 @@
+"""folders.txt 流式读写：出错只跳过所在的节、按偏移读取单节、追加写入"""
+import IconFolio
+
+SAMPLE = (
+    "# 注释\n"
+    "游离的行=1\n"
+    "[游戏]\n"
+    "LocalizedResourceName=我的游戏\n"
+    "IconResource=bin/Game.exe\n"
+    "\n"
+    "[坏节]\n"
+    "LocalizedResourceName=\xff\n"
+    "IconResource=a.exe\n"
+    "[工具]\n"
+    "LocalizedResourceName: 工具箱\n"
+    "这一行没有分隔符\n"
+    "IconResource=tool.exe\n"
+    "[游戏]\n"
+    "IconResource=other.exe\n"
+)
+
+
+def write_sample(tmp_path):
+    path = tmp_path / "folders.txt"
+    # 坏节中的 \xff 按原样写成一个无法用 gbk 解码的字节
+    path.write_bytes(SAMPLE.replace("\xff", "@@").encode("gbk").replace(b"@@", b"\xff"))
+    return str(path)
+
+
+def test_errors_only_skip_their_section(tmp_path):
+    reader = IconFolio.FoldersTxtReader(write_sample(tmp_path), "gbk")
+    records = list(reader)
+    assert [(r.section, r.alias, r.icon, r.line) for r in records] == [
+        ("游戏", "我的游戏", "bin/Game.exe", 3),
+        ("工具", "工具箱", "tool.exe", 10),
+    ]
+    assert [line_no for line_no, _ in reader.errors] == [2, 8, 12, 14]
+    assert "重复" in reader.errors[-1][1]
+
+
+def test_read_section_jumps_to_offset(tmp_path):
+    path = write_sample(tmp_path)
+    reader = IconFolio.FoldersTxtReader(path, "gbk")
+    assert reader.sections() == ["游戏", "坏节", "工具"]
+    tool = reader.read_section("工具")
+    assert (tool.alias, tool.icon, tool.line) == ("工具箱", "tool.exe", 10)
+    assert reader.read_section("游戏").icon == "bin/Game.exe"  # 重复的节不覆盖第一节
+    assert reader.read_section("坏节") is None
+    assert IconFolio.FoldersTxtReader(path, "gbk").read_section("不存在") is None
+
+
+def test_bom_is_stripped(tmp_path):
+    path = tmp_path / "folders.txt"
+    path.write_bytes("\ufeff[A]\nIconResource=a.exe\n".encode("utf-8"))
+    assert [r.section for r in IconFolio.FoldersTxtReader(str(path), "utf-8")] == ["A"]
+
+
+def test_writer_overwrite_and_append(tmp_path):
+    path = str(tmp_path / "folders.txt")
+    with IconFolio.FoldersTxtWriter(path, IconFolio.FOLDERS_TXT_HEADER, encoding="utf-8") as writer:
+        writer.add("A", "甲", "a.exe")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("[B]\nIconResource=b.exe")  # 手动编辑后末尾没有换行
+    with IconFolio.FoldersTxtWriter(path, IconFolio.FOLDERS_TXT_HEADER, append=True, encoding="utf-8") as writer:
+        writer.add("C", "丙", "c.exe")
+    assert writer.count == 1
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    assert text.count(IconFolio.FOLDERS_TXT_HEADER) == 1
+    records = list(IconFolio.FoldersTxtReader(path, "utf-8"))
+    assert [(r.section, r.alias, r.icon) for r in records] == [
+        ("A", "甲", "a.exe"), ("B", None, "b.exe"), ("C", "丙", "c.exe")]
@@ -0,0 +1,94 @@
+"""图标缓存副本解析：CMMM 记录、缓存中的路径串、按缓存文件修改时间判断是否已缓存"""
+import os
+import struct
+
+import pytest
+
+import IconFolio
+
+
+def cmmm_entry(version, entry_hash, identifier, data=b"", width=0, height=0, pad=0):
+    header_size = IconFolio._CMMM_ENTRY_HEADER.get(version, IconFolio._CMMM_ENTRY_HEADER_WIN8)
+    id_bytes = identifier.encode("utf-16-le")
+    header = bytearray(header_size)
+    struct.pack_into("<4sIQ", header, 0, b"CMMM", header_size + len(id_bytes) + pad + len(data), entry_hash)
+    if version == 20:
+        struct.pack_into("<III", header, 24, len(id_bytes), pad, len(data))
+    elif version == 21:
+        struct.pack_into("<III", header, 16, len(id_bytes), pad, len(data))
+    else:
+        struct.pack_into("<IIIII", header, 16, len(id_bytes), pad, len(data), width, height)
+    return bytes(header) + id_bytes + bytes(pad) + data
+
+
+def cmmm_file(version, entries):
+    if version >= 30:
+        header = struct.pack("<4sIIII", b"CMMM", version, 0, 0, 20)
+    else:
+        header = struct.pack("<4sIII", b"CMMM", version, 0, 16)
+    return header + b"".join(entries)
+
+
+@pytest.mark.parametrize("version", [20, 21, 30, 32])
+def test_parse_icon_cache_db(version):
+    data = cmmm_file(version, [
+        cmmm_entry(version, 0x1234, "", data=b"\x89PNG....", width=32, height=32, pad=4),
+        cmmm_entry(version, 0xABCD, "abc", data=b"BM"),
+    ])
+    parsed_version, entries = IconFolio.parse_icon_cache_db(data)
+    assert parsed_version == version
+    assert [e.hash for e in entries] == [0x1234, 0xABCD]
+    assert entries[1].identifier == "abc"
+    assert [e.data_size for e in entries] == [8, 2]
+    first = entries[0]
+    assert data[first.offset:first.offset + first.data_size] == b"\x89PNG...."
+    if version >= 30:
+        assert (first.width, first.height) == (32, 32)
+
+
+def test_parse_icon_cache_db_stops_at_damage():
+    good = cmmm_entry(30, 1, "ok")
+    data = cmmm_file(30, [good, b"XXXX" + bytes(60)])
+    assert [e.hash for e in IconFolio.parse_icon_cache_db(data)[1]] == [1]
+    with pytest.raises(ValueError):
+        IconFolio.parse_icon_cache_db(b"not a cache file at all!")
+
+
+def test_extract_cached_paths_any_alignment():
+    path = "C:\\Games\\Game\\bin\\Game.exe"
+    for prefix in (b"", b"\x00"):
+        data = prefix + path.encode("utf-16-le") + b"\x00\x00"
+        assert IconFolio.extract_cached_paths(data) == {os.path.normcase(path)}
+
+
+def write_cache(path, text, mtime):
+    path.write_bytes(b"junk" + text.encode("utf-16-le") + b"\x00\x00")
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def test_has_icon_uses_mtime_of_file_containing_path(tmp_path):
+    old = write_cache(tmp_path / "IconCache.db", "C:\\Old\\a.exe", 1000)
+    new = write_cache(tmp_path / "iconcache_32.db", "C:\\New\\b.exe", 5000)
+    state = IconFolio.IconCacheState([old, new, str(tmp_path / "missing.db")])
+    assert state.can_verify
+    assert len(state.errors) == 1
+    # 较新的缓存文件不能证明只出现在旧文件中的路径已重新缓存
+    assert not state.has_icon("C:\\Old\\a.exe", 2000)
+    assert state.has_icon("C:\\New\\b.exe", 2000)
+    assert not state.has_icon("C:\\Other\\c.exe", 0)
+
+
+def test_split_cached_folders(tmp_path, monkeypatch):
+    monkeypatch.setattr(IconFolio, "DESKTOP_INI_ENCODING", "gbk")  # "ansi" 只在 Windows 上可用
+    cache = write_cache(tmp_path / "iconcache_32.db", "C:\\Games\\A\\a.exe", 5000)
+    root = tmp_path / "root"
+    for name, icon, mtime in [("A", "C:\\Games\\A\\a.exe", 1000), ("B", "C:\\Games\\B\\b.exe", 1000),
+                              ("C", "C:\\Games\\A\\a.exe", 9000)]:
+        (root / name).mkdir(parents=True)
+        ini = root / name / "desktop.ini"
+        ini.write_text(f"[.ShellClassInfo]\nIconResource={icon},0\n", encoding="ascii")
+        os.utime(ini, (mtime, mtime))
+    (root / "D").mkdir()
+    state = IconFolio.IconCacheState([cache])
+    assert IconFolio.split_cached_folders(str(root), ["A", "B", "C", "D"], state) == (["A"], ["B", "C", "D"])
@@ -0,0 +1,34 @@
+"""共享图标库：只清除没有desktop.ini引用的图标，读不到desktop.ini时不清除"""
+import os
+
+import IconFolio
+
+
+def make_root(tmp_path):
+    store = IconFolio.IconStore(str(tmp_path))
+    os.makedirs(store.dir)
+    used, unused = store.icon_path("a" * 40), store.icon_path("b" * 40)
+    for path in (used, unused):
+        with open(path, "wb") as f:
+            f.write(b"\0\0\1\0")
+    (tmp_path / "Game").mkdir()
+    (tmp_path / "Game" / "desktop.ini").write_text(f"[.ShellClassInfo]\nIconResource={used},0\n", encoding="gbk")
+    return store, used, unused
+
+
+def test_collect_garbage_keeps_referenced_icons(tmp_path, win32):
+    store, used, unused = make_root(tmp_path)
+    snapshot = IconFolio.DirectorySnapshot(str(tmp_path))
+    assert store.collect_garbage(snapshot) == 1
+    assert os.path.exists(used) and not os.path.exists(unused)
+
+
+def test_unreadable_desktop_ini_skips_collection(tmp_path, win32, monkeypatch):
+    store, used, unused = make_root(tmp_path)
+
+    def locked(path):
+        raise PermissionError(path)
+    monkeypatch.setattr(IconFolio, "read_desktop_ini_icon", locked)
+    snapshot = IconFolio.DirectorySnapshot(str(tmp_path))
+    assert store.collect_garbage(snapshot) == 0
+    assert os.path.exists(used) and os.path.exists(unused)
@@ -0,0 +1,71 @@
+"""断点续跑日志：续跑、放弃旧运行、输入变化、压缩时保留其他操作的进度"""
+import os
+
+import IconFolio
+
+
+def interrupted(root, operation="generate", signature="sig", folders=("A",)):
+    journal = IconFolio.RunJournal(str(root), operation, signature)
+    journal.start()
+    for folder in folders:
+        journal.step(folder, "ok")
+    journal.close()  # 模拟中断：没有记录结束
+    return journal.run_id
+
+
+def test_resume_continues_same_run(tmp_path):
+    run_id = interrupted(tmp_path, folders=("A", "B"))
+    journal = IconFolio.RunJournal(str(tmp_path), "generate", "sig")
+    assert journal.start(resume=True) == {"A": "ok", "B": "ok"}
+    assert journal.run_id == run_id
+    journal.step("C")
+    journal.finish()
+    assert IconFolio.RunJournal.unfinished(str(tmp_path)) == {}
+    assert not os.path.exists(os.path.join(tmp_path, IconFolio.JOURNAL_NAME))
+
+
+def test_declined_run_is_abandoned(tmp_path):
+    interrupted(tmp_path)
+    asked = []
+    journal = IconFolio.RunJournal(str(tmp_path), "generate", "sig")
+    assert journal.start(resume=lambda label, count: asked.append((label, count)) or False) == {}
+    assert asked == [(IconFolio.JOURNAL_LABELS["generate"], 1)]
+    # 中断前放弃的旧运行不能再被当作未完成
+    assert IconFolio.RunJournal.unfinished(str(tmp_path)) == {"generate": {
+        "op": "generate", "sig": "sig", "done": {}, "finished": False}}
+    journal.finish()
+    assert IconFolio.RunJournal.unfinished(str(tmp_path)) == {}
+
+
+def test_changed_input_starts_over(tmp_path):
+    interrupted(tmp_path, signature="old")
+    journal = IconFolio.RunJournal(str(tmp_path), "generate", "new")
+    assert journal.start(resume=True) == {}
+    journal.finish()
+    assert IconFolio.RunJournal.unfinished(str(tmp_path)) == {}
+
+
+def test_run_without_steps_does_not_linger(tmp_path):
+    interrupted(tmp_path, folders=())
+    journal = IconFolio.RunJournal(str(tmp_path), "generate", "sig")
+    journal.start()
+    journal.finish()
+    assert IconFolio.RunJournal.unfinished(str(tmp_path)) == {}
+
+
+def test_finish_keeps_other_operations(tmp_path):
+    interrupted(tmp_path, operation="refresh", folders=("A", "B"))
+    journal = IconFolio.RunJournal(str(tmp_path), "generate", "sig")
+    journal.start()
+    journal.step("A")
+    journal.finish()
+    unfinished = IconFolio.RunJournal.unfinished(str(tmp_path))
+    assert list(unfinished) == ["refresh"]
+    assert unfinished["refresh"]["done"] == {"A": "ok", "B": "ok"}
+
+
+def test_half_written_line_is_ignored(tmp_path):
+    interrupted(tmp_path)
+    with open(os.path.join(tmp_path, IconFolio.JOURNAL_NAME), "a", encoding="utf-8") as f:
+        f.write('{"run": "x", "event": "st')
+    assert IconFolio.RunJournal.unfinished(str(tmp_path))["generate"]["done"] == {"A": "ok"}
@@ -0,0 +1,54 @@
+"""PE 图标读取与提取：用 pip 自带的 distlib 启动器（带图标组的真实 EXE）做样本"""
+import os
+import struct
+
+import pytest
+
+import IconFolio
+
+distlib = pytest.importorskip("pip._vendor.distlib")
+LAUNCHER_DIR = os.path.dirname(distlib.__file__)
+
+
+def launcher(name):
+    path = os.path.join(LAUNCHER_DIR, name)
+    if not os.path.isfile(path):
+        pytest.skip(f"没有 {name}")
+    return path
+
+
+@pytest.mark.parametrize("name, subsystem", [("t64.exe", 3), ("w64.exe", 2), ("t32.exe", 3)])
+def test_read_pe_icon_info(name, subsystem):
+    info = IconFolio.read_pe_icon_info(launcher(name))
+    assert info.has_icon_group
+    assert info.icon_sizes == [16, 32, 48]
+    assert info.subsystem == subsystem  # 2=窗口程序，3=控制台程序
+
+
+def test_read_pe_icon_info_rejects_non_pe(tmp_path):
+    text = tmp_path / "readme.exe"
+    text.write_bytes(b"MZ but not really a PE file")
+    truncated = tmp_path / "truncated.exe"
+    with open(launcher("w64.exe"), "rb") as f:
+        truncated.write_bytes(f.read(1024))
+    assert IconFolio.read_pe_icon_info(str(text)) is None
+    assert IconFolio.read_pe_icon_info(str(truncated)) is None
+
+
+def test_extract_icon_group_builds_valid_ico():
+    path = launcher("w64.exe")
+    ico = IconFolio.extract_icon_group(path)
+    reserved, kind, count = struct.unpack_from("<HHH", ico, 0)
+    assert (reserved, kind) == (0, 1) and count >= 3  # 同一尺寸可有多种色深
+    offset = 6 + 16 * count
+    widths = []
+    for i in range(count):
+        width, height, _, _, planes, bit_count, size, image_offset = struct.unpack_from("<BBBBHHII", ico, 6 + 16 * i)
+        assert image_offset == offset
+        image = ico[image_offset:image_offset + size]
+        assert image[:8] == b"\x89PNG\r\n\x1a\n" or struct.unpack_from("<I", image)[0] == 40
+        widths.append(width)
+        offset += size
+    assert offset == len(ico)
+    assert sorted(set(widths)) == IconFolio.read_pe_icon_info(path).icon_sizes
+    assert IconFolio.extract_icon_group(path, group_index=1) is None
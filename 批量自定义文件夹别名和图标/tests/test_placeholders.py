@@ -0,0 +1,77 @@
+"""云同步占位文件：用假的属性后端验证不打开占位EXE、排序靠后、按操作目录统计"""
+import os
+
+import pytest
+
+import IconFolio
+
+
+class FakeAttributeBackend:
+    """文件名含 cloud 的视为占位文件；broken 中的路径读取属性时出错"""
+
+    def __init__(self, broken=()):
+        self.broken = set(broken)
+
+    @staticmethod
+    def attributes(name):
+        return IconFolio.FILE_ATTRIBUTE_RECALL_ON_DATA_ACCESS if "cloud" in name else 0
+
+    def entry_attributes(self, entry):
+        return self.attributes(entry.name)
+
+    def path_attributes(self, path):
+        if path in self.broken:
+            raise OSError(path)
+        return self.attributes(os.path.basename(path))
+
+
+@pytest.fixture
+def guard(monkeypatch):
+    guard = IconFolio.PlaceholderGuard(FakeAttributeBackend())
+    monkeypatch.setattr(IconFolio, "PLACEHOLDERS", guard)
+    monkeypatch.setattr(IconFolio, "_PE_INFO_CACHE", {})
+    return guard
+
+
+def test_is_placeholder_records_avoided(tmp_path):
+    broken = str(tmp_path / "cloud_broken.exe")
+    guard = IconFolio.PlaceholderGuard(FakeAttributeBackend(broken=[broken]))
+    assert guard.is_placeholder(str(tmp_path / "cloud.exe"))
+    assert not guard.is_placeholder(str(tmp_path / "local.exe"))
+    assert not guard.is_placeholder(broken)  # 读不到属性时按本地文件处理
+    assert guard.avoided == {os.path.normcase(str(tmp_path / "cloud.exe"))}
+
+
+def test_report_counts_only_given_root(tmp_path, capsys):
+    guard = IconFolio.PlaceholderGuard(FakeAttributeBackend())
+    for root in ("A", "AB"):
+        guard.is_placeholder(str(tmp_path / root / "cloud.exe"))
+    guard.report(str(tmp_path / "A"))
+    assert "跳过打开 1 个" in capsys.readouterr().out
+    assert guard.avoided == {os.path.normcase(str(tmp_path / "AB" / "cloud.exe"))}
+    guard.report()
+    assert not guard.avoided
+
+
+def make_folder(tmp_path, names):
+    folder = tmp_path / "Game"
+    folder.mkdir()
+    for name in names:
+        (folder / name).write_bytes(b"MZ")
+    return str(folder)
+
+
+def test_ranking_never_opens_placeholders(tmp_path, guard, monkeypatch):
+    opened = []
+    monkeypatch.setattr(IconFolio, "read_pe_icon_info", lambda path: opened.append(os.path.basename(path)))
+    folder = make_folder(tmp_path, ["a_cloud.exe", "b_local.exe"])
+    exes = IconFolio.get_valid_exes(folder, rank=True)
+    assert [rel_path for _, rel_path in exes] == ["b_local.exe", "a_cloud.exe"]
+    assert opened == ["b_local.exe"]
+    assert len(guard.avoided) == 1
+
+
+def test_skip_placeholder_exes(tmp_path, guard, monkeypatch):
+    monkeypatch.setattr(IconFolio, "SKIP_PLACEHOLDER_EXES", True)
+    folder = make_folder(tmp_path, ["a_cloud.exe", "b_local.exe"])
+    assert [rel_path for _, rel_path in IconFolio.get_valid_exes(folder, rank=False)] == ["b_local.exe"]
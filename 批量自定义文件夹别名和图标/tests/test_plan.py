@@ -0,0 +1,96 @@
+"""folders.txt → desktop.ini：最小变更计划、预览不写入、不在配置中的desktop.ini只删除本工具管理的"""
+import hashlib
+import os
+
+import pytest
+
+import IconFolio
+
+
+@pytest.fixture
+def root(tmp_path, win32, monkeypatch):
+    monkeypatch.setattr(IconFolio, "EXTRACT_ICONS", False)
+    for name in ("A", "B", "NoExe"):
+        (tmp_path / name).mkdir()
+    for name in ("A", "B"):
+        (tmp_path / name / "app.exe").write_bytes(b"MZ")
+    return tmp_path
+
+
+def configure(root, sections):
+    with open(root / "folders.txt", "w", encoding="utf-8") as f:
+        for section, alias, icon in sections:
+            f.write(f"[{section}]\nLocalizedResourceName={alias}\nIconResource={icon}\n\n")
+    return IconFolio.RootContext(str(root), encoding="utf-8", use_config_db=False)
+
+
+def files(root):
+    result = {}
+    for dir_path, _, names in os.walk(root):
+        for name in names:
+            with open(os.path.join(dir_path, name), "rb") as f:
+                result[os.path.relpath(os.path.join(dir_path, name), root)] = hashlib.sha1(f.read()).hexdigest()
+    return result
+
+
+def plan_actions(ctx):
+    snapshot = IconFolio.get_folder_snapshot(ctx.root)
+    records = IconFolio.load_folder_records(ctx)
+    manifest = IconFolio.DesktopIniManifest.load(ctx.root)
+    return {item.folder: item.action
+            for item in IconFolio.build_desktop_ini_plan(ctx.root, records, snapshot, manifest=manifest)}
+
+
+CONFIG = [("A", "甲", "app.exe"), ("B", "乙", "app.exe"), ("NoExe", "无", "missing.exe"), ("Gone", "无", "a.exe")]
+
+
+def test_dry_run_writes_nothing(root):
+    ctx = configure(root, CONFIG)
+    before = files(root)
+    counts = IconFolio.apply_config(ctx, dry_run=True)
+    assert counts == {"create": 2, "skip": 2}
+    assert files(root) == before
+
+
+def test_only_changed_folders_are_rewritten(root):
+    ctx = configure(root, CONFIG)
+    counts = IconFolio.apply_config(ctx)
+    assert (counts["written"], counts["skipped"]) == (2, 2)
+    with open(root / "A" / "desktop.ini", "rb") as f:
+        assert "甲".encode("gbk") in f.read()
+    assert plan_actions(ctx) == {"A": "noop", "B": "noop", "NoExe": "skip", "Gone": "skip"}
+
+    ctx = configure(root, [("A", "甲", "app.exe"), ("B", "新别名", "app.exe")])
+    assert plan_actions(ctx) == {"A": "noop", "B": "update"}
+    counts = IconFolio.apply_config(ctx)
+    assert (counts["written"], counts["unchanged"]) == (1, 1)
+    assert IconFolio.DesktopIniManifest.load(str(root)).pending == {"A", "B"}
+
+
+def test_orphans_only_deleted_when_managed_and_unmodified(root):
+    IconFolio.apply_config(configure(root, CONFIG[:2]))
+    (root / "Hand").mkdir()
+    (root / "Hand" / "desktop.ini").write_text("[.ShellClassInfo]\n", encoding="gbk")  # 用户手写的
+    ctx = configure(root, [("NoExe", "无", "missing.exe")])
+    assert plan_actions(ctx) == {"NoExe": "skip", "A": "delete", "B": "delete", "Hand": "unmanaged"}
+
+    with open(root / "B" / "desktop.ini", "ab") as f:
+        f.write(b"; edited\n")
+    assert plan_actions(ctx)["B"] == "unmanaged"
+
+    counts = IconFolio.apply_config(ctx, delete_orphans=False)
+    assert counts["deleted"] == 0 and (root / "A" / "desktop.ini").exists()
+    asked = []
+    counts = IconFolio.apply_config(ctx, delete_orphans=lambda deletes: asked.append(deletes) or True)
+    assert [item.folder for item in asked[0]] == ["A"]
+    assert (counts["deleted"], counts["unmanaged"]) == (1, 2)
+    assert not (root / "A" / "desktop.ini").exists()
+    assert (root / "B" / "desktop.ini").exists() and (root / "Hand" / "desktop.ini").exists()
+
+
+def test_skip_leaves_finished_folders_out_of_plan(root):
+    ctx = configure(root, CONFIG[:2])
+    snapshot = IconFolio.get_folder_snapshot(ctx.root)
+    records = IconFolio.load_folder_records(ctx)
+    plan = IconFolio.build_desktop_ini_plan(ctx.root, records, snapshot, skip={"A": "written"})
+    assert [item.folder for item in plan] == ["B"]
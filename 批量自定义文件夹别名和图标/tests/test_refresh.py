@@ -0,0 +1,51 @@
+"""批量刷新：缓存生成失败时整批重试，分批调用共用一个时间预算"""
+import IconFolio
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def test_chunks_share_one_time_budget(tmp_path, win32, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(IconFolio.time, "perf_counter", clock.perf_counter)
+    monkeypatch.setattr(IconFolio.time, "sleep", clock.sleep)
+    monkeypatch.setattr(IconFolio, "trigger_icon_cache", lambda path: False)
+    monkeypatch.setattr(IconFolio, "notify_folder_updated", lambda path, flush=False: None)
+    folders = []
+    for name in ("A", "B", "C"):
+        (tmp_path / name).mkdir()
+        folders.append(str(tmp_path / name))
+
+    scheduler = IconFolio.RefreshScheduler(time_budget=1.0)
+    results = {}
+    for folder in folders:  # 每批一个文件夹
+        results.update(scheduler.run([folder]))
+    assert clock.now <= 1.0  # 各批的重试等待合计不超过总预算
+    assert scheduler.retries == len(clock.slept)
+    assert list(results.values()) == [(True, False)] * 3
+    # 属性恢复为刷新前的值
+    assert {win32.attributes[path] for path in folders} == {0x80}
+
+
+def test_cached_attributes_are_not_read_again(tmp_path, win32, monkeypatch):
+    monkeypatch.setattr(IconFolio, "trigger_icon_cache", lambda path: True)
+    monkeypatch.setattr(IconFolio, "notify_folder_updated", lambda path, flush=False: None)
+    (tmp_path / "A").mkdir()
+    path = str(tmp_path / "A")
+
+    def unexpected(path):
+        raise AssertionError(f"读取了属性：{path}")
+    monkeypatch.setattr(win32, "GetFileAttributes", unexpected)
+    results = IconFolio.RefreshScheduler().run([path], attributes={path: 0x11})
+    assert results == {path: (True, True)}
+    assert win32.attributes[path] == 0x11  # 加过系统属性后恢复为快照中的值
@@ -0,0 +1,58 @@
+"""EXE扫描索引：目录未变时复用记录，但原地覆盖的EXE要重新解析"""
+import os
+
+import pytest
+
+import IconFolio
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    """把“PE解析”换成按文件内容判断是否带图标，并记录解析过的文件"""
+    calls = []
+
+    def fake_read(path):
+        calls.append(os.path.basename(path))
+        with open(path, "rb") as f:
+            return IconFolio.PeIconInfo(f.read().startswith(b"ICON"), [32], 2)
+    monkeypatch.setattr(IconFolio, "read_pe_icon_info", fake_read)
+    monkeypatch.setattr(IconFolio, "_PE_INFO_CACHE", {})
+    return calls
+
+
+def ranked(folder, index):
+    return [rel_path for _, rel_path in IconFolio.get_valid_exes(folder, rank=True, index=index)]
+
+
+def test_unchanged_directories_are_reused(tmp_path, parsed):
+    folder = tmp_path / "Game"
+    (folder / "bin").mkdir(parents=True)
+    (folder / "setup.exe").write_bytes(b"MZ")
+    (folder / "bin" / "Game.exe").write_bytes(b"ICON")
+    index = IconFolio.ScanIndex.load(str(tmp_path))
+    assert ranked(str(folder), index) == ["bin/Game.exe".replace("/", os.sep), "setup.exe"]
+    index.save()
+
+    index = IconFolio.ScanIndex.load(str(tmp_path))
+    parsed.clear()
+    ranked(str(folder), index)
+    assert (index.hits, index.misses) == (2, 0)
+    assert parsed == []  # PE信息也从索引复用
+
+
+def test_exe_overwritten_in_place_is_parsed_again(tmp_path, parsed):
+    folder = tmp_path / "Game"
+    folder.mkdir()
+    (folder / "a.exe").write_bytes(b"MZ")
+    (folder / "b.exe").write_bytes(b"ICON")
+    index = IconFolio.ScanIndex.load(str(tmp_path))
+    assert ranked(str(folder), index) == ["b.exe", "a.exe"]
+
+    # 原地覆盖 a.exe：所在目录的 mtime 不变，索引仍命中
+    dir_stat = os.stat(folder)
+    (folder / "a.exe").write_bytes(b"ICON with a new build")
+    os.utime(folder, ns=(dir_stat.st_atime_ns, dir_stat.st_mtime_ns))
+    parsed.clear()
+    assert ranked(str(folder), index) == ["a.exe", "b.exe"]
+    assert parsed == ["a.exe"]
+    assert index.hits == 1
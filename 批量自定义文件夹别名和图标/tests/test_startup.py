@@ -0,0 +1,38 @@
+"""启动耗时回归检查：导入时不加载延迟模块，python -m IconFolio --version 在预算内"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import IconFolio
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(IconFolio.__file__))
+
+
+def run(args, env=None):
+    return subprocess.run([sys.executable, *args], cwd=SCRIPT_DIR, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def median_ms(args, env, runs=7):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run(args, env)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def test_import_does_not_load_lazy_modules():
+    probe = "import sys, IconFolio as m; print(' '.join(n for n in m.LAZY_MODULES if n in sys.modules))"
+    assert run(["-c", probe]).stdout.split() == []
+
+
+def test_version_within_budget():
+    # 缓存字节码后测量（设置了 PYTHONDONTWRITEBYTECODE 时每次都会重新编译整个脚本）
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"}
+    assert run(["-m", "IconFolio", "--version"], env).stdout.strip() == IconFolio.VERSION
+    baseline = median_ms(["-c", "pass"], env)
+    overhead = median_ms(["-m", "IconFolio", "--version"], env) - baseline
+    assert overhead <= IconFolio.STARTUP_BUDGET_MS, f"启动比空解释器多出 {overhead:.1f} 毫秒"